@@ -0,0 +1,132 @@
+import queue
+from flask import Blueprint, Response, current_app, render_template, request, redirect, url_for, jsonify, flash
+from sqlalchemy.orm import joinedload
+from models import db, User, Product, Order
+from decorators import admin_required
+from money import Money
+import analytics
+import events
+
+# Страницы админ-панели. Загружаются только воркерами с частью 'admin' (см. create_app)
+admin = Blueprint('admin', __name__, url_prefix='/admin')
+
+# Пустой комментарий в потоке событий, чтобы прокси не закрывали соединение
+EVENTS_KEEPALIVE = 15
+
+@admin.route('')
+@admin_required
+def admin_dashboard():
+    # Получаем все заказы с информацией о пользователе
+    orders = db.session.query(
+        Order,
+        User.username
+    ).join(
+        User, Order.user_id == User.id
+    ).order_by(
+        Order.order_date.desc()
+    ).all()
+
+    users = User.query.all()
+
+    return render_template(
+        'admin_dashboard.html',
+        orders=orders,
+        users=users
+    )
+
+@admin.route('/orders')
+@admin_required
+def admin_orders():
+    orders = Order.query.order_by(Order.order_date.desc()).all()
+    return render_template('admin_dashboard.html', orders=orders)
+
+@admin.route('/orders/<int:order_id>')
+@admin_required
+def admin_order_details(order_id):
+    order = Order.query.options(
+        joinedload(Order.items)
+    ).options(
+        joinedload(Order.user)
+    ).get_or_404(order_id)
+    return render_template('admin_order_details.html', order=order)
+
+@admin.route('/orders/update-status/<int:order_id>', methods=['POST'])
+@admin_required
+def update_order_status(order_id):
+    order = Order.query.get_or_404(order_id)
+    new_status = request.form.get('status')
+    if new_status:
+        old_status = order.status
+        order.status = new_status
+        analytics.status_changed(order, old_status)
+        db.session.commit()
+        flash('Order status updated successfully!', 'success')
+    return redirect(url_for('admin.admin_order_details', order_id=order_id))
+
+@admin.route('/add_product', methods=['POST'])
+@admin_required
+def add_product():
+    data = request.get_json()
+    try:
+        price = Money.parse(data['price'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Генерация имени файла на основе названия товара
+    image_name = f"{data['name'].lower().replace(' ', '_')}.png"
+
+    product = Product(
+        name=data['name'],
+        price=price,
+        category=data.get('category'),
+        description=data.get('description'),
+        stock_quantity=data.get('stock_quantity', 0),
+        image_file=image_name  # Автоматическое назначение
+    )
+
+    db.session.add(product)
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'product_id': product.id,
+        'image_name': image_name  # Возвращаем имя для ручной загрузки
+    })
+
+@admin.route('/events')
+@admin_required
+def admin_events():
+    """Поток изменений заказов, сообщений и остатков для открытых панелей (Server-Sent Events)"""
+    app = current_app._get_current_object()
+    # Сначала подписка, потом догоняющие события - так ничего не теряется между ними
+    subscriber = events.bus.subscribe(app)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    missed = events.replay(last_id) if last_id is not None else []
+    db.session.remove()
+
+    def stream():
+        sent = last_id or 0
+        try:
+            yield "retry: 3000\n\n"
+            if missed is None:
+                yield events.format_sse(None, 'resync', '{}')
+            for event_id, kind, payload in missed or []:
+                sent = event_id
+                yield events.format_sse(event_id, kind, payload)
+            while True:
+                try:
+                    item = subscriber.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if item is None:
+                    return
+                event_id, kind, payload = item
+                if event_id is not None and event_id <= sent:
+                    continue
+                yield events.format_sse(event_id, kind, payload)
+        finally:
+            events.bus.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
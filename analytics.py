@@ -0,0 +1,294 @@
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, delete, func, or_
+from models import db, Order, OrderItem, Product, DailySales, DailyProductSales
+from money import Money, money_sum
+
+# Окно отчёта по умолчанию (в днях), если даты не указаны
+DEFAULT_WINDOW_DAYS = 30
+# Отменённые заказы не считаются продажами: они не входят в сводки, а смена статуса
+# на этот и обратно вычитает заказ из сводок и возвращает его (см. status_changed)
+CANCELLED = 'Cancelled'
+
+
+def parse_window(start=None, end=None):
+    """Разбирает даты вида YYYY-MM-DD и возвращает (start, end) включительно.
+
+    Сводки ведутся по дням UTC (order_date пишется через utcnow), поэтому и окно
+    по умолчанию заканчивается текущим днём UTC.
+    """
+    try:
+        end_day = date.fromisoformat(end) if end else datetime.utcnow().date()
+        start_day = date.fromisoformat(start) if start else end_day - timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    except ValueError:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    if start_day > end_day:
+        raise ValueError('Start date must not be after end date')
+    return start_day, end_day
+
+
+def _upsert_insert():
+    """Возвращает insert() с поддержкой ON CONFLICT для текущей БД или None"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _add_to_rollup(model, rows, counters):
+    """Прибавляет счётчики к строкам сводки, создавая недостающие строки.
+
+    Для SQLite/PostgreSQL это один INSERT ... ON CONFLICT DO UPDATE на все строки,
+    поэтому параллельные воркеры не теряют обновления.
+    """
+    if not rows:
+        return
+    keys = [column.key for column in model.__table__.primary_key.columns]
+    dialect_insert = _upsert_insert()
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(model)
+        update = {name: getattr(model, name) + getattr(stmt.excluded, name) for name in counters}
+        update.update({name: getattr(stmt.excluded, name) for name in rows[0] if name not in keys and name not in counters})
+        db.session.execute(stmt.on_conflict_do_update(index_elements=keys, set_=update), rows)
+        return
+
+    # Запасной путь для остальных БД: get-or-create через ORM
+    for row in rows:
+        existing = db.session.get(model, tuple(row[key] for key in keys))
+        if existing is None:
+            db.session.add(model(**row))
+            continue
+        for name, value in row.items():
+            if name in counters:
+                setattr(existing, name, getattr(existing, name) + value)
+            elif name not in keys:
+                setattr(existing, name, value)
+
+
+def record_order(order, order_items, sign=1):
+    """Учитывает заказ в дневных сводках (sign=-1 - вычитает его).
+
+    Вызывается в той же транзакции, что и изменение заказа, до commit().
+    """
+    day = (order.order_date or datetime.utcnow()).date()
+    per_product = {}
+    for item in order_items:
+        line = per_product.setdefault(item.product_id, {'units': 0, 'revenue': Money(0)})
+        line['units'] += item.quantity
+        line['revenue'] += item.quantity * item.price_per_item
+
+    if not per_product:
+        return
+
+    product_rows = []
+    for product_id, line in per_product.items():
+        # Товары уже загружены при оформлении заказа, get() берёт их из identity map
+        product = db.session.get(Product, product_id)
+        product_rows.append({
+            'day': day,
+            'product_id': product_id,
+            'category': product.category if product else None,
+            'units': sign * line['units'],
+            'revenue': sign * line['revenue'],
+        })
+
+    _add_to_rollup(DailyProductSales, product_rows, counters=('units', 'revenue'))
+    _add_to_rollup(DailySales, [{
+        'day': day,
+        'orders_count': sign,
+        'units': sum(row['units'] for row in product_rows),
+        'revenue': sum(row['revenue'] for row in product_rows),
+    }], counters=('orders_count', 'units', 'revenue'))
+
+
+def status_changed(order, old_status):
+    """Вычитает заказ из сводок при отмене и возвращает при смене статуса 'Cancelled' на другой.
+
+    Вызывается после присвоения нового статуса, в той же транзакции.
+    """
+    was_counted, is_counted = old_status != CANCELLED, order.status != CANCELLED
+    if was_counted != is_counted:
+        record_order(order, order.items, sign=1 if is_counted else -1)
+
+
+def order_deleted(order):
+    """Вычитает удаляемый заказ из сводок, если он там учтён"""
+    if order.status != CANCELLED:
+        record_order(order, order.items, sign=-1)
+
+
+def rebuild_rollups(start=None, end=None):
+    """Пересчитывает сводки из истории OrderItem одним агрегирующим запросом на таблицу.
+
+    Нужен для первичного заполнения и после ручных правок заказов.
+    Возвращает количество пересчитанных дней.
+    """
+    day_column = func.date(Order.order_date)
+    conditions = [or_(Order.status.is_(None), Order.status != CANCELLED)]
+    if start:
+        conditions.append(Order.order_date >= datetime.combine(start, datetime.min.time()))
+    if end:
+        conditions.append(Order.order_date < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    for model in (DailySales, DailyProductSales):
+        stmt = delete(model)
+        if start:
+            stmt = stmt.where(model.day >= start)
+        if end:
+            stmt = stmt.where(model.day <= end)
+        db.session.execute(stmt)
+
+    revenue = func.sum(OrderItem.quantity * OrderItem.price_per_item)
+    product_query = select(
+        day_column, OrderItem.product_id, func.max(Product.category), func.sum(OrderItem.quantity), revenue
+    ).join(Order, OrderItem.order_id == Order.id)\
+     .outerjoin(Product, OrderItem.product_id == Product.id)\
+     .where(*conditions)\
+     .group_by(day_column, OrderItem.product_id)
+    db.session.execute(insert(DailyProductSales).from_select(
+        ['day', 'product_id', 'category', 'units', 'revenue'], product_query))
+
+    day_query = select(
+        day_column, func.count(func.distinct(Order.id)), func.sum(OrderItem.quantity), revenue
+    ).join(Order, OrderItem.order_id == Order.id)\
+     .where(*conditions)\
+     .group_by(day_column)
+    result = db.session.execute(insert(DailySales).from_select(
+        ['day', 'orders_count', 'units', 'revenue'], day_query))
+
+    db.session.commit()
+    return result.rowcount
+
+
+def _average(revenue, orders_count):
+    # Целочисленное деление центов с округлением половины вверх
+    return Money((revenue.minor * 2 + orders_count) // (orders_count * 2)) if orders_count else Money(0)
+
+
+def sales_summary(start, end):
+    """Итоги за период: выручка, штуки, заказы и средний чек"""
+    orders_count, units, revenue = db.session.execute(
+        select(
+            func.coalesce(func.sum(DailySales.orders_count), 0),
+            func.coalesce(func.sum(DailySales.units), 0),
+            money_sum(DailySales.revenue),
+        ).where(DailySales.day.between(start, end))
+    ).one()
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'orders': int(orders_count),
+        'units': int(units),
+        'revenue': revenue,
+        'average_order_value': _average(revenue, orders_count),
+    }
+
+
+def sales_by_day(start, end, limit=None):
+    rows = db.session.execute(
+        select(DailySales).where(DailySales.day.between(start, end)).order_by(DailySales.day).limit(limit)
+    ).scalars()
+    return [{
+        'day': row.day.isoformat(),
+        'orders': row.orders_count,
+        'units': row.units,
+        'revenue': row.revenue,
+        'average_order_value': _average(row.revenue, row.orders_count),
+    } for row in rows]
+
+
+def sales_by_product(start, end, limit=None):
+    totals = select(
+        DailyProductSales.product_id,
+        func.sum(DailyProductSales.units).label('units'),
+        money_sum(DailyProductSales.revenue).label('revenue'),
+    ).where(DailyProductSales.day.between(start, end))\
+     .group_by(DailyProductSales.product_id)\
+     .subquery()
+
+    query = select(totals, Product.name, Product.category)\
+        .outerjoin(Product, Product.id == totals.c.product_id)\
+        .order_by(totals.c.revenue.desc())\
+        .limit(limit)
+    return [{
+        'product_id': row.product_id,
+        'name': row.name,
+        'category': row.category,
+        'units': int(row.units),
+        'revenue': row.revenue,
+    } for row in db.session.execute(query)]
+
+
+def sales_by_category(start, end, limit=None):
+    query = select(
+        DailyProductSales.category,
+        func.sum(DailyProductSales.units).label('units'),
+        money_sum(DailyProductSales.revenue).label('revenue'),
+    ).where(DailyProductSales.day.between(start, end))\
+     .group_by(DailyProductSales.category)\
+     .order_by(func.sum(DailyProductSales.revenue).desc())\
+     .limit(limit)
+    return [{
+        'category': row.category,
+        'units': int(row.units),
+        'revenue': row.revenue,
+    } for row in db.session.execute(query)]
+
+
+REPORTS = {
+    'day': sales_by_day,
+    'product': sales_by_product,
+    'category': sales_by_category,
+}
+
+
+@click.command("rebuild-sales-rollups")
+@click.option('--start', help='First day to rebuild (YYYY-MM-DD), default: all history')
+@click.option('--end', help='Last day to rebuild (YYYY-MM-DD), default: all history')
+@with_appcontext
+def rebuild_sales_rollups_command(start, end):
+    """Пересчитывает дневные сводки продаж из истории заказов"""
+    try:
+        start_day = date.fromisoformat(start) if start else None
+        end_day = date.fromisoformat(end) if end else None
+    except ValueError:
+        raise click.BadParameter('Dates must be in YYYY-MM-DD format')
+    if start_day and end_day and start_day > end_day:
+        raise click.BadParameter('Start date must not be after end date')
+    days = rebuild_rollups(start_day, end_day)
+    print(f"Sales rollups rebuilt for {days} days.")
+
+
+@click.command("sales-report")
+@click.option('--start', help='First day (YYYY-MM-DD), default: 30 days ago')
+@click.option('--end', help='Last day (YYYY-MM-DD), default: today (UTC)')
+@click.option('--by', 'group_by', type=click.Choice(list(REPORTS)), default='day', show_default=True)
+@click.option('--limit', type=click.IntRange(min=1), help='Maximum number of rows')
+@with_appcontext
+def sales_report_command(start, end, group_by, limit):
+    """Отчёт о продажах: выручка, штуки и средний чек за период"""
+    try:
+        start_day, end_day = parse_window(start, end)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    rows = REPORTS[group_by](start_day, end_day, limit)
+    summary = sales_summary(start_day, end_day)
+
+    print(f"Sales by {group_by}: {summary['start']} .. {summary['end']}")
+    if rows:
+        columns = list(rows[0])
+        widths = {c: max(len(c), *(len(str(row[c])) for row in rows)) for c in columns}
+        print("  ".join(c.ljust(widths[c]) for c in columns))
+        for row in rows:
+            print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+    else:
+        print("No sales in this period.")
+    print(f"Total: {summary['orders']} orders, {summary['units']} units, "
+          f"revenue {summary['revenue']}, average order {summary['average_order_value']}")
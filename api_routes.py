@@ -2,13 +2,25 @@ import os
 import uuid
 from flask import Blueprint, jsonify, request, session, current_app, url_for
 from werkzeug.utils import secure_filename
-from models import db, Product, User, ContactMessage, Order, OrderItem, CartItem
-from decorators import admin_required, login_required
+from models import db, Product, User, ContactMessage, Order
+from decorators import admin_required
 from utils import validate_image
+from money import Money
+import analytics
+import cache
+import contact_inbox
+import inventory
+import product_import
 
 # --- КОНФИГУРАЦИЯ ---
 api = Blueprint('api', __name__, url_prefix='/api')
 
+# Сколько товаров максимум можно запросить по ?ids= за раз
+MAX_PRODUCT_IDS = 200
+
+def _page_size():
+    return max(1, min(request.args.get('limit', inventory.DEFAULT_PAGE_SIZE, type=int), inventory.MAX_PAGE_SIZE))
+
 def allowed_file(filename):
     """Проверяет, что расширение файла разрешено"""
     return '.' in filename and \
@@ -62,8 +74,18 @@ def upload_image():
 @api.route('/products', methods=['GET'])
 @admin_required
 def get_products():
-    products = Product.query.order_by(Product.id).all()
-    return jsonify([{'id': p.id, 'name': p.name, 'price': p.price, 'stock_quantity': p.stock_quantity, 'category': p.category, 'description': p.description, 'image_file': p.image_file} for p in products])
+    """Все товары или только перечисленные в ?ids=1,2,3 (панель догружает изменённые)"""
+    query = Product.query.order_by(Product.id)
+    if 'ids' in request.args:
+        try:
+            ids = [int(value) for value in request.args['ids'].split(',') if value.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+        if len(ids) > MAX_PRODUCT_IDS:
+            return jsonify({'error': f'At most {MAX_PRODUCT_IDS} ids per request'}), 400
+        query = query.filter(Product.id.in_(ids))
+    products = query.all()
+    return jsonify([{'id': p.id, 'name': p.name, 'price': p.price, 'stock_quantity': p.stock_quantity, 'reorder_level': p.reorder_level, 'category': p.category, 'description': p.description, 'image_file': p.image_file} for p in products])
 
 @api.route('/products', methods=['POST'])
 @admin_required
@@ -73,6 +95,10 @@ def create_product():
     # Валидация обязательных полей
     if not all([data.get('name'), data.get('price')]):
         return jsonify({'error': 'Name and price are required'}), 400
+    try:
+        price = Money.parse(data['price'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Генерация имени изображения
     base_name = data['name'].lower().replace(' ', '_').replace("'", "")
@@ -80,10 +106,11 @@ def create_product():
 
     product = Product(
         name=data['name'],
-        price=float(data['price']),
+        price=price,
         category=data.get('category'),
         description=data.get('description'),
         stock_quantity=int(data.get('stock_quantity', 0)),
+        reorder_level=int(data.get('reorder_level', Product.reorder_level.default.arg)),
         image_file=image_name
     )
 
@@ -97,14 +124,58 @@ def create_product():
         'message': 'Upload image manually via FTP/SFTP'
     })
 
+@api.route('/products/bulk', methods=['POST'])
+@admin_required
+def bulk_import_products():
+    """Массовый импорт товаров: файл CSV/NDJSON в поле 'file' или в теле запроса.
+
+    images_dir - подпапка IMPORT_IMAGES_FOLDER с изображениями для колонки 'image'.
+    """
+    upload = request.files.get('file')
+    try:
+        if upload:
+            fmt = product_import.detect_format(upload.filename, upload.mimetype)
+            stream = upload.stream
+        else:
+            fmt = product_import.detect_format(None, request.content_type)
+            stream = request.stream
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    images_dir = None
+    if request.args.get('images_dir'):
+        base = current_app.config['IMPORT_IMAGES_FOLDER']
+        images_dir = os.path.join(base, secure_filename(request.args['images_dir']))
+        if not os.path.isdir(images_dir):
+            return jsonify({'error': 'Images directory not found'}), 400
+
+    batch_size = request.args.get('batch_size', product_import.DEFAULT_BATCH_SIZE, type=int)
+    if batch_size < 1:
+        return jsonify({'error': 'batch_size must be at least 1'}), 400
+
+    # Изображения копируются в пуле потоков: fork многопоточного воркера небезопасен
+    report = product_import.import_products(
+        product_import.open_text_stream(stream),
+        fmt,
+        images_dir=images_dir,
+        batch_size=batch_size,
+        dry_run=request.args.get('dry_run') == '1',
+    )
+    return jsonify(report.to_dict())
+
 @api.route('/products/<int:id>', methods=['PUT'])
 @admin_required
 def update_product(id):
     product = Product.query.get_or_404(id)
     data = request.get_json()
+    try:
+        price = Money.parse(data.get('price', product.price))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     product.name = data.get('name', product.name)
-    product.price = float(data.get('price', product.price))
+    product.price = price
     product.stock_quantity = int(data.get('stock_quantity', product.stock_quantity))
+    product.reorder_level = int(data.get('reorder_level', product.reorder_level))
     product.category = data.get('category', product.category)
     product.description = data.get('description', product.description)
     product.image_file = data.get('image_file', product.image_file) or 'product_placeholder.png'
@@ -143,8 +214,13 @@ def delete_user(id):
 @api.route('/messages', methods=['GET'])
 @admin_required
 def get_messages():
-    messages = ContactMessage.query.order_by(ContactMessage.timestamp.desc()).all()
-    return jsonify([{'id': msg.id, 'from': f"{msg.first_name} {msg.last_name}", 'email': msg.email, 'subject': msg.subject, 'message': msg.message, 'received_at': msg.timestamp.strftime('%Y-%m-%d %H:%M')} for msg in messages])
+    """Сообщения от новых к старым постранично по id (?before_id=&limit=)"""
+    limit = _page_size()
+    messages = contact_inbox.messages_page(request.args.get('before_id', type=int), limit)
+    return jsonify({
+        'items': [contact_inbox.message_payload(msg) for msg in messages],
+        'next_before_id': messages[-1].id if len(messages) == limit else None,
+    })
 
 @api.route('/messages/<int:id>', methods=['DELETE'])
 @admin_required
@@ -177,34 +253,84 @@ def update_order_address(id):
 @admin_required
 def delete_order(id):
     order = Order.query.get_or_404(id)
+    analytics.order_deleted(order)
     db.session.delete(order)
     db.session.commit()
     return jsonify({'message': 'Order deleted successfully'})
 
-# === API для Корзины (Cart) ===
+# === API для Аналитики (Analytics) ===
 
-@api.route('/cart/item/<int:item_id>', methods=['PUT'])
-@login_required
-def update_cart_item(item_id):
-    """Обновляет количество товара в корзине."""
-    item = CartItem.query.filter_by(id=item_id, user_id=session['user_id']).first_or_404()
-    data = request.get_json()
+@api.route('/admin/analytics/summary', methods=['GET'])
+@admin_required
+def analytics_summary():
+    try:
+        start, end = analytics.parse_window(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(analytics.sales_summary(start, end))
+
+@api.route('/admin/analytics/sales', methods=['GET'])
+@admin_required
+def analytics_sales():
+    """Продажи за период по дням, товарам или категориям (?by=day|product|category)"""
+    group_by = request.args.get('by', 'day')
+    if group_by not in analytics.REPORTS:
+        return jsonify({'error': f"Unknown grouping '{group_by}'"}), 400
+    try:
+        start, end = analytics.parse_window(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    limit = request.args.get('limit', type=int)
+    if 'limit' in request.args and (limit is None or limit < 1):
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    return jsonify({
+        'summary': analytics.sales_summary(start, end),
+        'by': group_by,
+        'rows': analytics.REPORTS[group_by](start, end, limit),
+    })
 
-    if 'quantity' in data:
-        new_quantity = int(data['quantity'])
-        if new_quantity > 0:
-            item.quantity = new_quantity
-        else:
-            db.session.delete(item)
+# === API для Склада (Inventory) ===
 
-    db.session.commit()
-    return jsonify({'success': True, 'message': 'Cart updated.'})
-
-@api.route('/cart/item/<int:item_id>', methods=['DELETE'])
-@login_required
-def delete_cart_item(item_id):
-    """Удаляет товар из корзины."""
-    item = CartItem.query.filter_by(id=item_id, user_id=session['user_id']).first_or_404()
-    db.session.delete(item)
-    db.session.commit()
-    return jsonify({'success': True, 'message': 'Item removed from cart.'})
\ No newline at end of file
+@api.route('/admin/inventory/low-stock', methods=['GET'])
+@admin_required
+def inventory_low_stock():
+    """Товары с остатком на пороге дозаказа или ниже, самые дефицитные первыми (?page=&limit=)"""
+    page = db.paginate(inventory.low_stock_query(), page=request.args.get('page', 1, type=int),
+                       per_page=_page_size(), error_out=False)
+    return jsonify({
+        'items': [inventory.stock_payload(p) for p in page.items],
+        'page': page.page,
+        'pages': page.pages,
+        'total': page.total,
+    })
+
+@api.route('/admin/inventory/stock', methods=['GET'])
+@admin_required
+def inventory_stock():
+    """Текущие остатки постранично по id (?after_id=&limit=)"""
+    limit = _page_size()
+    products = inventory.stock_page(request.args.get('after_id', 0, type=int), limit)
+    return jsonify({
+        'items': [inventory.stock_payload(p) for p in products],
+        'next_after_id': products[-1].id if len(products) == limit else None,
+    })
+
+@api.route('/admin/inventory/movements', methods=['GET'])
+@api.route('/admin/inventory/<int:product_id>/movements', methods=['GET'])
+@admin_required
+def inventory_movements(product_id=None):
+    """Журнал движения склада от новых записей к старым (?before_id=&limit=)"""
+    limit = _page_size()
+    movements = inventory.movements_page(product_id, request.args.get('before_id', type=int), limit)
+    return jsonify({
+        'items': [inventory.movement_payload(m) for m in movements],
+        'next_before_id': movements[-1].id if len(movements) == limit else None,
+    })
+
+# === API для Кэша (Cache) ===
+
+@api.route('/admin/cache/stats', methods=['GET'])
+@admin_required
+def cache_stats():
+    """Попадания, промахи, вытеснения и сбросы по пространствам имён кэша воркера, обработавшего запрос"""
+    return jsonify(cache.stats())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Замер пропускной способности gunicorn для разных конфигураций воркеров.
+
+Запускает gunicorn с каждой конфигурацией WORKERSxTHREADS, ждёт /readyz и
+нагружает страницы витрины конкурентными клиентами.
+
+    SECRET_KEY=bench python benchmarks/bench_serving.py --configs 1x1,1x4,2x4,4x4
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATHS = ['/', '/catalog', '/product/1', '/search?q=a']
+
+
+def wait_ready(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=2)
+            connection.request('GET', '/readyz')
+            if connection.getresponse().status == 200:
+                return time.monotonic()
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError('Server did not become ready')
+
+
+def run_load(host, port, paths, clients, duration):
+    """Каждый клиент держит keep-alive соединение и отправляет запросы по кругу"""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection(host, port, timeout=10)
+        own, index = [], offset
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                connection.request('GET', paths[index % len(paths)])
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    raise OSError(response.status)
+                own.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=10)
+            index += 1
+        with lock:
+            latencies.extend(own)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / duration,
+        'p50': statistics.median(latencies) * 1000 if latencies else 0,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0,
+        'errors': errors[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default='1x1,1x4,2x4,4x4', help='Comma separated WORKERSxTHREADS')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--paths', default=','.join(DEFAULT_PATHS))
+    args = parser.parse_args()
+
+    if not os.environ.get('SECRET_KEY'):
+        sys.exit('Set SECRET_KEY, wsgi.py refuses to start without it')
+
+    paths = args.paths.split(',')
+    print(f"{'workers':>7} {'threads':>7} {'ready s':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for config in args.configs.split(','):
+        workers, threads = (int(value) for value in config.lower().split('x'))
+        env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads),
+                   GUNICORN_BIND=f'127.0.0.1:{args.port}', GUNICORN_ACCESS_LOG='/dev/null',
+                   DB_POOL_SIZE=str(threads))
+        started = time.monotonic()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            ready = wait_ready('127.0.0.1', args.port) - started
+            result = run_load('127.0.0.1', args.port, paths, args.clients, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{workers:>7} {threads:>7} {ready:>8.2f} {result['rps']:>8.1f} "
+              f"{result['p50']:>8.1f} {result['p99']:>8.1f} {result['errors']:>6}")
+
+
+if __name__ == '__main__':
+    main()
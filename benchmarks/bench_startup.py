@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Замер холодного старта воркера для разных наборов SHOP_PARTS.
+
+Каждый замер - отдельный процесс Python: импорт и create_app(), прогрев
+(шаблоны и пул соединений) и первый запрос к главной странице. Кэш шаблонов
+проверяется пустым ("cold") и заполненным командой precompile-templates ("warm").
+
+    python benchmarks/bench_startup.py --repeat 7
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Выполняется в дочернем процессе, печатает времена этапов в миллисекундах
+PROBE = r'''
+import json, time
+started = time.perf_counter()
+from app import create_app
+from serving import warm_up
+app = create_app()
+created = time.perf_counter()
+warm_up(app)
+warmed = time.perf_counter()
+app.test_client().get(FIRST_PATH)
+done = time.perf_counter()
+print(json.dumps({
+    'create_app': (created - started) * 1000,
+    'warm_up': (warmed - created) * 1000,
+    'first_request': (done - warmed) * 1000,
+    'total': (done - started) * 1000,
+}))
+'''
+
+FIRST_PATHS = {'storefront,admin': '/', 'storefront': '/', 'admin': '/healthz'}
+
+
+def probe(parts, cache_dir):
+    env = dict(os.environ, SHOP_PARTS=parts, TEMPLATE_CACHE_FOLDER=cache_dir)
+    code = PROBE.replace('FIRST_PATH', repr(FIRST_PATHS[parts]))
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    stages = ['create_app', 'warm_up', 'first_request', 'total']
+    print(f"{'parts':<18} {'cache':<6} " + ' '.join(f'{stage + " ms":>17}' for stage in stages))
+    for parts in FIRST_PATHS:
+        for cache in ('cold', 'warm'):
+            runs = []
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    if cache == 'warm':
+                        env = dict(os.environ, SHOP_PARTS=parts, TEMPLATE_CACHE_FOLDER=cache_dir)
+                        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'precompile-templates'],
+                                       cwd=ROOT, env=env, capture_output=True, check=True)
+                    runs.append(probe(parts, cache_dir))
+            medians = [statistics.median(run[stage] for run in runs) for stage in stages]
+            print(f"{parts:<18} {cache:<6} " + ' '.join(f'{value:>17.1f}' for value in medians))
+
+
+if __name__ == '__main__':
+    main()
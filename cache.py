@@ -0,0 +1,268 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import event, insert, select, delete, func, or_, inspect as sa_inspect
+from sqlalchemy.orm import Session
+from models import db, CacheInvalidation, Product, CartItem
+
+# Как часто каждый воркер читает журнал сбросов (секунды). Столько максимум
+# другие воркеры могут отдавать устаревшее значение после записи.
+POLL_INTERVAL = 0.5
+# Страховка на случай пропущенного сброса (например, после сбоя опроса)
+DEFAULT_TTL = 300
+# Сколько хранить строки журнала сбросов
+RETENTION = timedelta(hours=1)
+# Как часто каждый воркер пишет счётчики кэша в лог (секунды)
+STATS_LOG_INTERVAL = 300
+# Сколько секунд перечитывать пропущенные id журнала: их транзакция могла ещё не зафиксироваться
+GAP_TIMEOUT = 10
+# Больше пропусков не отслеживаем - самые старые забываются (их страхует DEFAULT_TTL)
+MAX_GAPS = 1000
+
+
+# === Локальный кэш воркера ===
+
+class CacheNamespace:
+    """LRU-кэш одного вида данных внутри процесса со счётчиками попаданий.
+
+    Значение, загруженное во время сброса этого пространства имён, не сохраняется:
+    иначе воркер мог бы запомнить данные, прочитанные до записи, уже после её сброса.
+    """
+
+    def __init__(self, name, maxsize, ttl=DEFAULT_TTL):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get_or_load(self, key, loader):
+        """Значение из кэша или loader() с сохранением результата"""
+        bus.ensure_started()
+        key = str(key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+        with self._lock:
+            if self._generation == generation:
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def drop(self, key=None):
+        """Удаляет ключ или, если key=None, всё пространство имён"""
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+            elif self._entries.pop(str(key), None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+namespaces = {}
+
+
+def namespace(name, maxsize, ttl=DEFAULT_TTL):
+    namespaces[name] = CacheNamespace(name, maxsize, ttl)
+    return namespaces[name]
+
+
+def stats():
+    """Счётчики всех пространств имён этого воркера"""
+    return {'pid': os.getpid(), 'namespaces': {name: ns.stats() for name, ns in namespaces.items()}}
+
+
+def clear_all():
+    for ns in namespaces.values():
+        ns.drop()
+
+
+# Кэши витрины
+products = namespace('product', maxsize=2000)                    # id -> снимок товара
+categories = namespace('categories', maxsize=1)                  # 'all' -> список категорий
+category_products = namespace('category_products', maxsize=200)  # категория -> снимки товаров
+cart_counts = namespace('cart_count', maxsize=10000)             # id пользователя -> штук в корзине
+
+
+def snapshot(obj):
+    """Копия колонок объекта: в кэше не хранятся объекты, привязанные к сессии"""
+    return SimpleNamespace(**{column.key: getattr(obj, column.key) for column in sa_inspect(obj).mapper.column_attrs})
+
+
+# === Публикация сбросов ===
+# Сбросы пишутся в таблицу cache_invalidation в той же транзакции, что и изменение.
+# Воркер, сделавший запись, сбрасывает ключи сразу после commit, остальные - при опросе.
+
+def _old_value(obj, field):
+    history = sa_inspect(obj).attrs[field].history
+    return history.deleted[0] if history.deleted else getattr(obj, field)
+
+
+def _collect(session):
+    """Ключи кэша, которые устаревают после текущего flush: (пространство имён, ключ)"""
+    keys = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Product):
+            if obj not in session.new:
+                keys.add((products.name, str(obj.id)))
+            old_category = _old_value(obj, 'category')
+            # Товары без категории не показываются на страницах категорий
+            keys.update((category_products.name, category) for category in (old_category, obj.category)
+                        if category is not None)
+            if obj in session.new or obj in session.deleted or old_category != obj.category:
+                keys.add((categories.name, 'all'))
+        elif isinstance(obj, CartItem):
+            keys.add((cart_counts.name, str(obj.user_id)))
+    return keys
+
+
+def publish(session, keys):
+    """Записывает сбросы в журнал в текущей транзакции сессии.
+
+    Нужен массовым UPDATE/DELETE, которые идут мимо событий сессии.
+    key=None сбрасывает всё пространство имён.
+    """
+    keys = {(name, None if key is None else str(key)) for name, key in keys}
+    if not keys:
+        return
+    session.connection().execute(insert(CacheInvalidation), [
+        {'namespace': name, 'key': key} for name, key in keys
+    ])
+    session.info.setdefault('cache_invalidations', set()).update(keys)
+
+
+def _record_invalidations(session, flush_context):
+    publish(session, _collect(session))
+
+
+def _apply_committed(session):
+    for name, key in session.info.pop('cache_invalidations', ()):
+        if name in namespaces:
+            namespaces[name].drop(key)
+
+
+def _discard_rolled_back(session):
+    session.info.pop('cache_invalidations', None)
+
+
+def init_app(app):
+    """Включает публикацию сбросов для всех сессий SQLAlchemy"""
+    bus.app = app
+    for name, listener in (('after_flush', _record_invalidations),
+                           ('after_commit', _apply_committed),
+                           ('after_rollback', _discard_rolled_back)):
+        if not event.contains(Session, name, listener):
+            event.listen(Session, name, listener)
+
+
+# === Доставка сбросов другим воркерам ===
+
+class InvalidationBus:
+    """Фоновый поток воркера, который читает журнал сбросов по первичному ключу.
+
+    Запускается при первом обращении к кэшу, то есть уже после fork в gunicorn.
+    Если журнал прочитать не удалось, воркер очищает все свои кэши.
+    В PostgreSQL параллельные транзакции могут зафиксироваться не в порядке id, и строка
+    с меньшим id появится уже после того, как last_id её обогнал. Поэтому пропущенные id
+    перечитываются ещё GAP_TIMEOUT секунд; пропуски от откатившихся транзакций просто истекают.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.last_id = None
+        self._gaps = {}  # пропущенный id -> до какого момента его перечитывать
+
+    def ensure_started(self):
+        if self._thread is not None or self.app is None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            with self.app.app_context():
+                self.last_id = db.session.execute(select(func.max(CacheInvalidation.id))).scalar() or 0
+                db.session.remove()
+            self._thread = threading.Thread(target=self._poll, name='cache-invalidation', daemon=True)
+            self._thread.start()
+
+    def _poll(self):
+        last_prune = last_stats = time.monotonic()
+        while True:
+            time.sleep(POLL_INTERVAL)
+            if time.monotonic() - last_stats > STATS_LOG_INTERVAL:
+                # /api/admin/cache/stats показывает один воркер, в логе - все
+                for name, counters in stats()['namespaces'].items():
+                    self.app.logger.info(f"Cache {name} [{os.getpid()}]: " +
+                                         ", ".join(f"{key}={value}" for key, value in counters.items()))
+                last_stats = time.monotonic()
+            now = time.monotonic()
+            self._gaps = {gap: deadline for gap, deadline in self._gaps.items() if deadline > now}
+            condition = CacheInvalidation.id > self.last_id
+            if self._gaps:
+                condition = or_(condition, CacheInvalidation.id.in_(list(self._gaps)))
+            try:
+                with self.app.app_context():
+                    rows = db.session.execute(
+                        select(CacheInvalidation.id, CacheInvalidation.namespace, CacheInvalidation.key)
+                        .where(condition).order_by(CacheInvalidation.id)
+                    ).all()
+                    if time.monotonic() - last_prune > 3600:
+                        prune()
+                        last_prune = time.monotonic()
+                    db.session.remove()
+            except Exception as e:
+                self.app.logger.error(f"Cache invalidation polling failed, clearing caches: {str(e)}")
+                clear_all()
+                continue
+
+            for row_id, name, key in rows:
+                if name in namespaces:
+                    namespaces[name].drop(key)
+                if row_id in self._gaps:
+                    del self._gaps[row_id]
+                elif row_id > self.last_id:
+                    for gap in range(max(self.last_id + 1, row_id - MAX_GAPS), row_id):
+                        self._gaps[gap] = now + GAP_TIMEOUT
+                    self.last_id = row_id
+            while len(self._gaps) > MAX_GAPS:
+                del self._gaps[min(self._gaps)]
+
+
+bus = InvalidationBus()
+
+
+def prune():
+    """Удаляет строки журнала старше RETENTION"""
+    db.session.execute(delete(CacheInvalidation).where(CacheInvalidation.created_at < datetime.utcnow() - RETENTION))
+    db.session.commit()
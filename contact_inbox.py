@@ -0,0 +1,257 @@
+import atexit
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, delete
+from models import db, ContactMessage
+import events
+
+# Сколько сообщений записывается одной транзакцией
+BATCH_SIZE = 50
+# Максимальная задержка записи сообщения в режиме 'buffered' (секунды)
+FLUSH_INTERVAL = 0.5
+# Больше сообщений в памяти не держим - новые пишутся сразу, как в режиме 'sync'
+MAX_PENDING = 1000
+# Сколько раз сообщение пытаются записать по одному, прежде чем отложить его в файл
+MAX_ATTEMPTS = 5
+# Пауза перед повтором после неудачной записи (секунды)
+RETRY_DELAY = 1
+# Файл в CONTACT_ARCHIVE_FOLDER для сообщений, которые так и не удалось записать
+FAILED_FILENAME = 'failed-messages.jsonl'
+# Сколько сообщений архивируется и удаляется за одну транзакцию
+ARCHIVE_CHUNK_SIZE = 1000
+
+# Режимы записи (CONTACT_DURABILITY):
+#   buffered - сообщение попадает в очередь воркера и записывается пачкой не позже
+#              чем через FLUSH_INTERVAL; при аварийном падении воркера очередь теряется
+#   sync     - сообщение записывается до ответа пользователю, как раньше
+DURABILITY_MODES = ('buffered', 'sync')
+
+
+def message_payload(msg):
+    return {
+        'id': msg.id,
+        'from': f"{msg.first_name} {msg.last_name}",
+        'email': msg.email,
+        'subject': msg.subject,
+        'message': msg.message,
+        'received_at': msg.timestamp.strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+def validate_message(values):
+    """Проверяет длину полей по колонкам ContactMessage до постановки в очередь"""
+    for column in ContactMessage.__table__.columns:
+        length = getattr(column.type, 'length', None)
+        value = values.get(column.key)
+        if length and isinstance(value, str) and len(value) > length:
+            label = column.key.replace('_', ' ').capitalize()
+            raise ValueError(f"{label} is too long (at most {length} characters)")
+
+
+# === Запись сообщений пачками ===
+
+class MessageWriter:
+    """Очередь сообщений формы обратной связи и фоновый поток, который пишет их пачками.
+
+    Один поток на воркер; сообщения пишутся в порядке поступления, а события
+    message.created для панели администратора публикуются при записи (см. events.py).
+    Если пачка не записалась, сообщения пишутся по одному; сообщение, которое не удалось
+    записать MAX_ATTEMPTS раз, откладывается в файл FAILED_FILENAME и не держит очередь.
+    """
+
+    def __init__(self):
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+    def submit(self, values):
+        """Принимает сообщение (dict полей ContactMessage) в текущем режиме записи.
+
+        ValueError - поле длиннее своей колонки; такое сообщение не ставится в очередь.
+        """
+        validate_message(values)
+        app = current_app._get_current_object()
+        values.setdefault('timestamp', datetime.utcnow())
+        if app.config['CONTACT_DURABILITY'] == 'sync':
+            self._write(app, [values], in_request=True)
+            return
+
+        with self._condition:
+            if self._closed or len(self._pending) >= MAX_PENDING:
+                overflow = True
+            else:
+                overflow = False
+                self._pending.append((values, 0))
+                if self._thread is None:
+                    self._start(app)
+                if len(self._pending) >= BATCH_SIZE:
+                    self._condition.notify()
+        if overflow:
+            self._write(app, [values], in_request=True)
+
+    def _start(self, app):
+        self._thread = threading.Thread(target=self._run, args=(app,), name='contact-writer', daemon=True)
+        self._thread.start()
+        # Сервер разработки и flask-команды не вызывают close() - дописываем очередь при выходе
+        atexit.register(self.close)
+
+    def _run(self, app):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self._pending) >= BATCH_SIZE or self._closed,
+                                         timeout=FLUSH_INTERVAL)
+                batch = [self._pending.popleft() for _ in range(min(BATCH_SIZE, len(self._pending)))]
+                finished = self._closed and not self._pending
+            if batch:
+                try:
+                    self._write(app, [values for values, _ in batch])
+                except Exception as e:
+                    app.logger.error(f"Failed to save {len(batch)} contact messages, retrying one by one: {str(e)}")
+                    if self._retry(app, batch) and not finished:
+                        time.sleep(RETRY_DELAY)
+            if finished:
+                return
+
+    def _retry(self, app, batch):
+        """Пишет сообщения пачки по одному, чтобы одна плохая строка не задерживала остальные.
+
+        Не записанные сообщения возвращаются в начало очереди, после MAX_ATTEMPTS попыток
+        (или при остановке воркера) - в файл. Возвращает число возвращённых в очередь.
+        """
+        retry, failed = [], []
+        for values, attempts in batch:
+            try:
+                self._write(app, [values])
+            except Exception as e:
+                if attempts + 1 >= MAX_ATTEMPTS or self._closed:
+                    failed.append((values, str(e)))
+                else:
+                    retry.append((values, attempts + 1))
+        if retry:
+            with self._condition:
+                self._pending.extendleft(reversed(retry))
+        if failed:
+            self._save_failed(app, failed)
+        return len(retry)
+
+    def _save_failed(self, app, failed):
+        """Дописывает сообщения, которые не удалось записать в базу, в FAILED_FILENAME"""
+        folder = app.config['CONTACT_ARCHIVE_FOLDER']
+        path = os.path.join(folder, FAILED_FILENAME)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as out:
+                for values, error in failed:
+                    out.write(json.dumps({**values, 'timestamp': values['timestamp'].isoformat(), 'error': error},
+                                         ensure_ascii=False) + "\n")
+        except OSError as e:
+            app.logger.error(f"Lost {len(failed)} contact messages, could not write {path}: {str(e)}")
+            return
+        app.logger.error(f"Moved {len(failed)} contact messages that could not be saved to {path}")
+
+    def _write(self, app, batch, in_request=False):
+        """Одна транзакция на пачку: все строки добавляются через add_all и записываются одним commit"""
+        if in_request:
+            db.session.add_all([ContactMessage(**values) for values in batch])
+            db.session.commit()
+            return
+        with app.app_context():
+            try:
+                db.session.add_all([ContactMessage(**values) for values in batch])
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+    def close(self, timeout=10):
+        """Дописывает очередь и останавливает поток (при остановке воркера)"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+
+writer = MessageWriter()
+
+
+# === Чтение для панели администратора ===
+
+def messages_page(before_id=None, limit=50):
+    """Сообщения от новых к старым, следующие limit записей с id меньше before_id"""
+    query = select(ContactMessage).order_by(ContactMessage.id.desc()).limit(limit)
+    if before_id is not None:
+        query = query.where(ContactMessage.id < before_id)
+    return db.session.execute(query).scalars().all()
+
+
+# === Хранение и архивирование ===
+
+def archive_messages(cutoff, folder):
+    """Переносит сообщения старше cutoff в сжатые помесячные файлы и удаляет их из таблицы.
+
+    Файлы messages-YYYY-MM.jsonl.gz дописываются (каждый запуск - новый gzip-поток,
+    gzip.open читает их подряд). Пачка удаляется только после записи файла на диск,
+    поэтому при сбое сообщение может попасть в архив дважды, но не потеряется.
+    Возвращает {месяц: количество сообщений}.
+    """
+    os.makedirs(folder, exist_ok=True)
+    archived = {}
+    while True:
+        rows = db.session.execute(
+            select(ContactMessage).where(ContactMessage.timestamp < cutoff)
+            .order_by(ContactMessage.id).limit(ARCHIVE_CHUNK_SIZE)
+        ).scalars().all()
+        if not rows:
+            break
+
+        by_month = {}
+        for msg in rows:
+            by_month.setdefault(msg.timestamp.strftime('%Y-%m'), []).append(msg)
+        for month, messages in by_month.items():
+            path = os.path.join(folder, f"messages-{month}.jsonl.gz")
+            with open(path, 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as out:
+                    for msg in messages:
+                        out.write((json.dumps({
+                            'id': msg.id,
+                            'first_name': msg.first_name,
+                            'last_name': msg.last_name,
+                            'email': msg.email,
+                            'subject': msg.subject,
+                            'message': msg.message,
+                            'timestamp': msg.timestamp.isoformat(),
+                        }, ensure_ascii=False) + "\n").encode('utf-8'))
+                raw.flush()
+                os.fsync(raw.fileno())
+            archived[month] = archived.get(month, 0) + len(messages)
+
+        ids = [msg.id for msg in rows]
+        db.session.execute(delete(ContactMessage).where(ContactMessage.id.in_(ids)))
+        # Массовый DELETE идёт мимо событий сессии - панель перечитает список целиком
+        events.publish_many(db.session, [('messages.archived', {'count': len(ids)})])
+        db.session.commit()
+        db.session.expunge_all()
+    return archived
+
+
+@click.command('archive-messages')
+@click.option('--days', type=int, help='Keep messages newer than this many days (default: CONTACT_RETENTION_DAYS)')
+@with_appcontext
+def archive_messages_command(days):
+    """Архивирует старые сообщения формы обратной связи в сжатые помесячные файлы"""
+    days = days if days is not None else current_app.config['CONTACT_RETENTION_DAYS']
+    folder = current_app.config['CONTACT_ARCHIVE_FOLDER']
+    archived = archive_messages(datetime.utcnow() - timedelta(days=days), folder)
+    for month, count in sorted(archived.items()):
+        print(f"{month}: {count} messages")
+    print(f"Archived {sum(archived.values())} messages older than {days} days into {folder}.")
@@ -0,0 +1,202 @@
+import csv
+import json
+import sys
+from datetime import date, datetime
+from itertools import chain, islice
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, func, text, inspect as sa_inspect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import selectinload, RelationshipDirection
+from models import db
+
+# Максимальная ширина колонки в табличном выводе
+MAX_COLUMN_WIDTH = 40
+# Сколько строк просматривать для подбора ширины колонок
+TABLE_SAMPLE_ROWS = 100
+
+
+def get_models():
+    """Возвращает {имя в нижнем регистре: модель} для всех моделей SQLAlchemy"""
+    return {mapper.class_.__name__.lower(): mapper.class_ for mapper in db.Model.registry.mappers}
+
+
+def _format_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+def _one_to_many(relationship):
+    return relationship.direction is RelationshipDirection.ONETOMANY
+
+
+def _relation_counts(relationship, ids):
+    """Считает связанные записи для пачки строк одним GROUP BY запросом"""
+    remote = next(iter(relationship.remote_side))
+    rows = db.session.execute(
+        select(remote, func.count()).where(remote.in_(ids)).group_by(remote)
+    )
+    return dict(rows.all())
+
+
+def iter_rows(model, where=None, limit=None, chunk_size=1000, relations='count'):
+    """Потоково отдаёт строки модели в виде словарей пачками по chunk_size.
+
+    relations: 'none' - без связей, 'count' - число связанных записей
+    (один запрос на связь и пачку), 'load' - id связанных записей через selectinload.
+    """
+    mapper = sa_inspect(model)
+    columns = [column.key for column in mapper.columns]
+    primary_key = mapper.primary_key[0]
+    relationships = [rel for rel in mapper.relationships if _one_to_many(rel)] if relations != 'none' else []
+    # Отношения lazy='dynamic' нельзя загрузить заранее - для них всегда выводим количество
+    loadable = [rel for rel in relationships if relations == 'load' and rel.lazy != 'dynamic']
+
+    query = select(model).order_by(primary_key).limit(limit)
+    if where:
+        query = query.where(text(where))
+    if loadable:
+        query = query.options(*(selectinload(getattr(model, rel.key)) for rel in loadable))
+
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for partition in result.scalars().partitions():
+        ids = [getattr(item, primary_key.key) for item in partition]
+        counts = {rel.key: _relation_counts(rel, ids) for rel in relationships if rel not in loadable}
+
+        for item in partition:
+            row = {column: _format_value(getattr(item, column)) for column in columns}
+            for rel in relationships:
+                if rel in loadable:
+                    related = sa_inspect(rel.mapper).primary_key[0].key
+                    row[rel.key] = [getattr(obj, related) for obj in getattr(item, rel.key)]
+                else:
+                    row[f'{rel.key}_count'] = counts[rel.key].get(getattr(item, primary_key.key), 0)
+            yield row
+
+        # Не держим уже выведенные объекты в identity map
+        db.session.expunge_all()
+
+
+def _write_table(rows, out):
+    # Ширину колонок определяем по первой пачке строк, остальные выводим потоком
+    rows = iter(rows)
+    head = list(islice(rows, TABLE_SAMPLE_ROWS))
+    if not head:
+        return
+    header = list(head[0])
+    widths = {key: min(MAX_COLUMN_WIDTH, max(len(key), *(len(str(row[key])) for row in head))) for key in header}
+    out.write("  ".join(key.ljust(widths[key]) for key in header).rstrip() + "\n")
+    for row in chain(head, rows):
+        cells = []
+        for key in header:
+            value = str(row[key]).replace("\n", " ")
+            if len(value) > widths[key]:
+                value = value[:widths[key] - 1] + "…"
+            cells.append(value.ljust(widths[key]))
+        out.write("  ".join(cells).rstrip() + "\n")
+
+
+def _write_json(rows, out):
+    out.write("[")
+    for index, row in enumerate(rows):
+        out.write(("," if index else "") + "\n  " + json.dumps(row, ensure_ascii=False, default=str))
+    out.write("\n]\n")
+
+
+def _write_csv(rows, out):
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(out, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+
+
+WRITERS = {'table': _write_table, 'json': _write_json, 'csv': _write_csv}
+
+
+def table_stats(exact=False):
+    """Размеры таблиц и число строк из статистики самой БД, без полного сканирования.
+
+    Возвращает список (таблица, строки, байты, источник числа строк).
+    """
+    tables = sorted(db.metadata.tables)
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    estimates, sizes = {}, {}
+
+    if dialect == 'postgresql':
+        rows = connection.execute(text(
+            "SELECT relname, reltuples::bigint, pg_total_relation_size(oid) FROM pg_class "
+            "WHERE relkind = 'r' AND relname = ANY(:tables)"
+        ), {'tables': tables})
+        for name, tuples, size in rows:
+            # reltuples = -1 пока таблицу ни разу не анализировали
+            if tuples >= 0:
+                estimates[name] = tuples
+            sizes[name] = size
+    elif dialect == 'sqlite':
+        has_stat = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        )).first()
+        if has_stat:
+            # Первое число в stat - количество строк таблицы (заполняется командой ANALYZE)
+            for name, stat in connection.execute(text("SELECT tbl, stat FROM sqlite_stat1")):
+                estimates[name] = max(estimates.get(name, 0), int(stat.split()[0]))
+        try:
+            rows = connection.execute(text(
+                "SELECT s.tbl_name, SUM(d.pgsize) FROM dbstat AS d "
+                "JOIN sqlite_master AS s ON s.name = d.name "
+                "WHERE d.aggregate = TRUE GROUP BY s.tbl_name"
+            ))
+            sizes = dict(rows.all())
+        except Exception:
+            # SQLite собран без SQLITE_ENABLE_DBSTAT_VTAB
+            pass
+
+    stats = []
+    for name in tables:
+        if exact or name not in estimates:
+            count = connection.execute(select(func.count()).select_from(db.metadata.tables[name])).scalar()
+            source = 'exact'
+        else:
+            count, source = estimates[name], 'estimate'
+        stats.append((name, count, sizes.get(name), source))
+    return stats
+
+
+@click.command('inspect')
+@click.argument('model', required=False)
+@click.option('--limit', type=int, default=50, show_default=True, help='Maximum number of rows (0 - no limit)')
+@click.option('--where', help='SQL condition, e.g. "stock_quantity < 5" or "price > 10000" '
+                              '(money columns are stored in cents, so this means over 100.00)')
+@click.option('--format', 'output_format', type=click.Choice(list(WRITERS)), default='table', show_default=True)
+@click.option('--relations', type=click.Choice(['none', 'count', 'load']), default='count', show_default=True,
+              help='How to show one-to-many relationships')
+@click.option('--chunk-size', type=int, default=1000, show_default=True, help='Rows fetched per round trip')
+@click.option('--stats', is_flag=True, help='Show row counts and sizes of all tables')
+@click.option('--exact', is_flag=True, help='With --stats: count rows instead of using database statistics')
+@with_appcontext
+def inspect_command(model, limit, where, output_format, relations, chunk_size, stats, exact):
+    """Выводит строки модели MODEL или статистику таблиц (без MODEL или с --stats)"""
+    if stats or not model:
+        rows = ({'table': name, 'rows': count, 'size_bytes': size, 'rows_source': source}
+                for name, count, size, source in table_stats(exact))
+        WRITERS[output_format](rows, sys.stdout)
+        return
+
+    models = get_models()
+    model_class = models.get(model.lower())
+    if model_class is None:
+        raise click.BadParameter(f"Unknown model. Available: {', '.join(sorted(models))}", param_hint='MODEL')
+
+    rows = iter_rows(model_class, where=where, limit=limit or None, chunk_size=chunk_size, relations=relations)
+    # Запрос выполняется при чтении первой строки - ошибку в --where ловим до начала вывода
+    try:
+        first = next(rows, None)
+    except DBAPIError as e:
+        raise click.BadParameter(str(e.orig), param_hint='--where')
+    if first is not None:
+        rows = chain([first], rows)
+    WRITERS[output_format](rows, sys.stdout)
@@ -11,7 +11,7 @@ def login_required(f):
         if 'user_id' not in session:
             flash('Please log in to access this page.', 'warning')
             #  Перенаправляем на главную страницу
-            return redirect(url_for('index'))
+            return redirect(url_for('shop.index'))
         return f(*args, **kwargs)
     return decorated_function
 
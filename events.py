@@ -0,0 +1,196 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert, select, delete, func, inspect as sa_inspect
+from sqlalchemy.orm import Session
+from models import db, AdminEvent, Order, ContactMessage, Product
+
+# Как часто каждый воркер проверяет журнал событий (секунды)
+POLL_INTERVAL = 1.0
+# Сколько хранить события: за это время переподключившаяся панель догонит пропущенное
+RETENTION = timedelta(hours=24)
+# Очередь медленного клиента не растёт бесконечно - при переполнении он перечитывает данные
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Сколько событий максимум отдаём при переподключении, дальше - полная перезагрузка
+REPLAY_LIMIT = 500
+
+
+# === Запись событий ===
+# События пишутся в таблицу admin_event в той же транзакции, что и изменение,
+# поэтому откатившиеся изменения не публикуются, а все воркеры видят одно и то же.
+
+def _order_payload(order):
+    return {
+        'id': order.id,
+        'order_number': order.order_number,
+        'customer': f"{order.customer_name} {order.customer_lastname}",
+        'total': str(order.total_price),
+        'status': order.status,
+        'date': order.order_date.strftime('%Y-%m-%d') if order.order_date else None,
+    }
+
+
+def _message_payload(msg):
+    return {
+        'id': msg.id,
+        'from': f"{msg.first_name} {msg.last_name}",
+        'email': msg.email,
+        'subject': msg.subject,
+        'message': msg.message,
+        'received_at': msg.timestamp.strftime('%Y-%m-%d %H:%M'),
+    }
+
+
+def _changed(obj, *fields):
+    state = sa_inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+
+def _collect(session):
+    """Превращает изменения текущего flush в список событий (kind, payload)"""
+    events = []
+    for obj in session.new:
+        if isinstance(obj, Order):
+            events.append(('order.created', _order_payload(obj)))
+        elif isinstance(obj, ContactMessage):
+            events.append(('message.created', _message_payload(obj)))
+        elif isinstance(obj, Product):
+            events.append(('products.changed', {'ids': [obj.id]}))
+    for obj in session.dirty:
+        if isinstance(obj, Order) and _changed(obj, 'status', 'shipping_address'):
+            events.append(('order.updated', {'id': obj.id, 'status': obj.status,
+                                             'shipping_address': obj.shipping_address}))
+        elif isinstance(obj, Product) and _changed(obj, 'stock_quantity'):
+            events.append(('product.stock', {'id': obj.id, 'stock_quantity': obj.stock_quantity}))
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            events.append(('order.deleted', {'id': obj.id}))
+        elif isinstance(obj, ContactMessage):
+            events.append(('message.deleted', {'id': obj.id}))
+        elif isinstance(obj, Product):
+            events.append(('product.deleted', {'id': obj.id}))
+    return events
+
+
+def _record_events(session, flush_context):
+    events = _collect(session)
+    if events:
+        publish_many(session, events)
+
+
+def init_app(app):
+    """Включает запись событий для всех сессий SQLAlchemy"""
+    if not event.contains(Session, 'after_flush', _record_events):
+        event.listen(Session, 'after_flush', _record_events)
+
+
+def publish_many(session, events):
+    """Добавляет события в журнал в текущей транзакции сессии"""
+    session.connection().execute(insert(AdminEvent), [
+        {'kind': kind, 'payload': json.dumps(payload)} for kind, payload in events
+    ])
+
+
+# === Доставка событий подписчикам ===
+
+class EventBus:
+    """Раздаёт новые строки журнала подписчикам внутри процесса.
+
+    Один фоновый поток на воркер опрашивает журнал по первичному ключу,
+    поэтому нагрузка на БД не зависит от числа открытых панелей.
+    В PostgreSQL параллельные транзакции могут зафиксироваться не в порядке id,
+    и такое событие панель не получит - она увидит изменение после перезагрузки.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.last_id = None
+
+    def subscribe(self, app):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                with app.app_context():
+                    self.last_id = db.session.execute(select(func.max(AdminEvent.id))).scalar() or 0
+                    db.session.remove()
+                self._thread = threading.Thread(target=self._poll, args=(app,), name='admin-events', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def close(self):
+        """Завершает все потоки событий (при остановке воркера)"""
+        self._closed = True
+        with self._lock:
+            for subscriber in self._subscribers:
+                self._offer(subscriber, None)
+
+    def _offer(self, subscriber, item):
+        try:
+            subscriber.put_nowait(item)
+        except queue.Full:
+            # Клиент не успевает: очищаем очередь и просим его перечитать всё
+            while not subscriber.empty():
+                subscriber.get_nowait()
+            subscriber.put_nowait((None, 'resync', '{}'))
+
+    def _poll(self, app):
+        last_prune = 0
+        while not self._closed:
+            time.sleep(POLL_INTERVAL)
+            try:
+                with app.app_context():
+                    rows = db.session.execute(
+                        select(AdminEvent.id, AdminEvent.kind, AdminEvent.payload)
+                        .where(AdminEvent.id > self.last_id).order_by(AdminEvent.id)
+                    ).all()
+                    if time.monotonic() - last_prune > 3600:
+                        prune()
+                        last_prune = time.monotonic()
+                    db.session.remove()
+            except Exception as e:
+                app.logger.error(f"Admin event polling failed: {str(e)}")
+                continue
+
+            if not rows:
+                continue
+            self.last_id = rows[-1][0]
+            with self._lock:
+                for subscriber in self._subscribers:
+                    for row in rows:
+                        self._offer(subscriber, tuple(row))
+
+
+bus = EventBus()
+
+
+def replay(after_id):
+    """События после after_id для переподключившегося клиента или None, если их слишком много"""
+    rows = db.session.execute(
+        select(AdminEvent.id, AdminEvent.kind, AdminEvent.payload)
+        .where(AdminEvent.id > after_id).order_by(AdminEvent.id).limit(REPLAY_LIMIT + 1)
+    ).all()
+    if len(rows) > REPLAY_LIMIT:
+        return None
+    return [tuple(row) for row in rows]
+
+
+def prune():
+    """Удаляет события старше RETENTION"""
+    db.session.execute(delete(AdminEvent).where(AdminEvent.created_at < datetime.utcnow() - RETENTION))
+    db.session.commit()
+
+
+def format_sse(event_id, kind, payload):
+    # Событие без id (resync) не сдвигает Last-Event-ID клиента
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {kind}\ndata: {payload}\n\n"
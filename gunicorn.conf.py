@@ -0,0 +1,73 @@
+"""Настройки gunicorn для продакшена. Все значения можно переопределить переменными окружения.
+
+Результаты замеров для разных конфигураций - в benchmarks/README.md.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Потоковые воркеры: запросы в основном ждут базу данных, а не процессор
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Каждый воркер сам импортирует приложение и открывает свой пул соединений (см. wsgi.py)
+preload_app = False
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# Сколько ждать завершения начатых запросов (в том числе оформления заказов) при остановке.
+# Ждёт сам gunicorn: воркер перестаёт принимать соединения и дожидается открытых
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Сколько секунд после SIGTERM воркер ещё принимает запросы и отвечает 503 на /readyz,
+# чтобы балансировщик успел это увидеть и снять его с балансировки. Входит в graceful_timeout
+SHUTDOWN_DELAY = float(os.environ.get('GUNICORN_SHUTDOWN_DELAY', 0))
+keepalive = 5
+
+# Перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def post_worker_init(worker):
+    """При SIGTERM сначала снимаем воркер с балансировки и закрываем потоки событий, затем обычная остановка gunicorn"""
+    from serving import begin_shutdown
+    from events import bus
+
+    default_handler = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        begin_shutdown()
+        # Открытые потоки событий иначе держали бы воркер до graceful_timeout
+        bus.close()
+        if SHUTDOWN_DELAY > 0:
+            # Без задержки воркер сразу перестаёт принимать соединения и 503 на /readyz никто не увидит
+            timer = threading.Timer(SHUTDOWN_DELAY, default_handler, (sig, frame))
+            timer.daemon = True
+            timer.start()
+        else:
+            default_handler(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit)
+
+
+def worker_exit(server, worker):
+    """Дописываем сообщения из очереди и закрываем соединения с базой.
+
+    Начатые запросы к этому моменту уже дождался gunicorn (не дольше graceful_timeout).
+    """
+    from models import db
+    from serving import in_flight
+    from contact_inbox import writer
+
+    left = in_flight()
+    if left:
+        worker.log.warning(f"Worker {worker.pid} exiting with {left} checkouts still in progress")
+    writer.close()
+    with worker.wsgi.app_context():
+        db.engine.dispose()
@@ -0,0 +1,148 @@
+from sqlalchemy import event, insert, select, inspect as sa_inspect
+from sqlalchemy.orm import Session
+from models import db, Product, OrderItem, StockMovement
+import events
+
+# Размер страницы в списках склада для панели администратора
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# === Журнал движения склада ===
+# Каждое изменение остатка записывается строкой StockMovement в той же транзакции,
+# что и само изменение. Строки только добавляются - текущий остаток хранится в Product.
+
+def _low(stock, reorder_level):
+    return stock is not None and reorder_level is not None and stock <= reorder_level
+
+
+def record_changes(session, changes, reason, order_ids=None):
+    """Пишет движения склада одним executemany и публикует пересечения порога дозаказа.
+
+    changes - список (id товара, старый остаток, новый остаток, старый порог, новый порог).
+    Старый остаток None означает новый товар: движение пишется, оповещение - нет.
+    order_ids - {id товара: id заказа} для списаний по заказам.
+    """
+    order_ids = order_ids or {}
+    movements, alerts = [], []
+    for product_id, old_stock, new_stock, old_level, new_level in changes:
+        if new_stock != old_stock:
+            movements.append({
+                'product_id': product_id,
+                'change': new_stock - (old_stock or 0),
+                'stock_after': new_stock,
+                'reason': reason if old_stock is not None else 'initial',
+                'order_id': order_ids.get(product_id),
+            })
+        if old_stock is None:
+            continue
+        was_low, is_low = _low(old_stock, old_level), _low(new_stock, new_level)
+        if was_low != is_low:
+            alerts.append(('stock.low' if is_low else 'stock.restocked', {
+                'id': product_id, 'stock_quantity': new_stock, 'reorder_level': new_level,
+            }))
+
+    if movements:
+        session.connection().execute(insert(StockMovement), movements)
+    if alerts:
+        events.publish_many(session, alerts)
+
+
+def _history(obj, field):
+    """(старое значение, новое значение) атрибута в текущем flush"""
+    history = sa_inspect(obj).attrs[field].history
+    new = getattr(obj, field)
+    if not history.has_changes():
+        return new, new
+    return (history.deleted[0] if history.deleted else None), new
+
+
+def _record_movements(session, flush_context):
+    # Остатки, уменьшенные оформлением заказа, приходят в одном flush с позициями заказа
+    order_ids = {item.product_id: item.order_id for item in session.new if isinstance(item, OrderItem)}
+    sold, adjusted = [], []
+    for obj in session.new:
+        if isinstance(obj, Product) and obj.stock_quantity:
+            adjusted.append((obj.id, None, obj.stock_quantity, None, obj.reorder_level))
+    for obj in session.dirty:
+        if not isinstance(obj, Product):
+            continue
+        old_stock, new_stock = _history(obj, 'stock_quantity')
+        old_level, new_level = _history(obj, 'reorder_level')
+        if old_stock == new_stock and old_level == new_level:
+            continue
+        change = (obj.id, old_stock, new_stock, old_level, new_level)
+        (sold if obj.id in order_ids and old_stock != new_stock else adjusted).append(change)
+
+    if sold:
+        record_changes(session, sold, 'order', order_ids)
+    if adjusted:
+        record_changes(session, adjusted, 'adjustment')
+
+
+def init_app(app):
+    """Включает журнал движения склада для всех сессий SQLAlchemy"""
+    if not event.contains(Session, 'after_flush', _record_movements):
+        event.listen(Session, 'after_flush', _record_movements)
+
+
+def snapshot(product_ids):
+    """Текущие остатки и пороги {id: (остаток, порог)} одним запросом по первичному ключу.
+
+    Нужен массовым UPDATE, которые идут мимо событий сессии (см. product_import.py).
+    """
+    if not product_ids:
+        return {}
+    rows = db.session.execute(
+        select(Product.id, Product.stock_quantity, Product.reorder_level).where(Product.id.in_(product_ids))
+    ).all()
+    return {product_id: (stock, level) for product_id, stock, level in rows}
+
+
+# === Запросы для панели администратора ===
+# Ни один из них не читает таблицу товаров целиком: заканчивающиеся товары берутся
+# из частичного индекса ix_product_low_stock, остальные списки - постранично по ключу.
+
+def stock_payload(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'category': product.category,
+        'stock_quantity': product.stock_quantity,
+        'reorder_level': product.reorder_level,
+    }
+
+
+def movement_payload(movement):
+    return {
+        'id': movement.id,
+        'product_id': movement.product_id,
+        'change': movement.change,
+        'stock_after': movement.stock_after,
+        'reason': movement.reason,
+        'order_id': movement.order_id,
+        'created_at': movement.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def low_stock_query():
+    # Условие совпадает с условием частичного индекса, иначе планировщик его не использует
+    return (select(Product)
+            .where(Product.stock_quantity <= Product.reorder_level)
+            .order_by(Product.stock_quantity, Product.id))
+
+
+def stock_page(after_id=0, limit=DEFAULT_PAGE_SIZE):
+    """Следующие limit товаров с id больше after_id"""
+    query = select(Product).where(Product.id > after_id).order_by(Product.id).limit(limit)
+    return db.session.execute(query).scalars().all()
+
+
+def movements_page(product_id=None, before_id=None, limit=DEFAULT_PAGE_SIZE):
+    """Движения склада от новых к старым, следующие limit записей с id меньше before_id"""
+    query = select(StockMovement).order_by(StockMovement.id.desc()).limit(limit)
+    if product_id is not None:
+        query = query.where(StockMovement.product_id == product_id)
+    if before_id is not None:
+        query = query.where(StockMovement.id < before_id)
+    return db.session.execute(query).scalars().all()
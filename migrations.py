@@ -0,0 +1,143 @@
+from sqlalchemy import Integer, inspect as sa_inspect, text
+from sqlalchemy.schema import CreateTable
+from money import MINOR_UNITS
+from models import db, SchemaVersion
+
+# Изменения схемы существующих таблиц, по порядку. Новые таблицы и индексы
+# создаются автоматически (db.create_all и _create_missing_indexes), здесь -
+# только то, что create_all не умеет: новые колонки и преобразование данных.
+# Миграции проверяют состояние схемы сами, поэтому на новой базе ничего не делают.
+MIGRATIONS = []
+
+
+def migration(description):
+    def register(f):
+        MIGRATIONS.append((len(MIGRATIONS) + 1, description, f))
+        return f
+    return register
+
+
+def _columns(connection, table):
+    return {column['name'] for column in sa_inspect(connection).get_columns(table)}
+
+
+@migration('Add product.reorder_level')
+def _add_reorder_level(connection):
+    if 'reorder_level' not in _columns(connection, 'product'):
+        connection.execute(text('ALTER TABLE product ADD COLUMN reorder_level INTEGER NOT NULL DEFAULT 5'))
+
+
+@migration('Store money as integer minor units')
+def _money_to_minor_units(connection):
+    columns = {
+        'product': ['price'],
+        'order': ['total_price'],
+        'order_item': ['price_per_item'],
+        'daily_sales': ['revenue'],
+        'daily_product_sales': ['revenue'],
+    }
+    inspector = sa_inspect(connection)
+    for table, names in columns.items():
+        types = {column['name']: column['type'] for column in inspector.get_columns(table)}
+        pending = [name for name in names if not isinstance(types[name], Integer)]
+        if not pending:
+            continue
+        convert = {name: f'CAST(ROUND("{name}" * {MINOR_UNITS}) AS INTEGER)' for name in pending}
+        if connection.dialect.name == 'sqlite':
+            _rebuild_sqlite_table(connection, table, convert)
+        else:
+            for name, expression in convert.items():
+                connection.execute(text(
+                    f'ALTER TABLE "{table}" ALTER COLUMN "{name}" TYPE INTEGER USING {expression}'))
+
+
+def _sqlite_autoincrement(connection, table):
+    """Пересоздаёт таблицу SQLite с AUTOINCREMENT, чтобы id удалённых строк не выдавались снова.
+
+    В PostgreSQL последовательности и так не возвращаются назад.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                             {'name': table}).scalar()
+    if sql is not None and 'AUTOINCREMENT' not in sql.upper():
+        _rebuild_sqlite_table(connection, table, {})
+
+
+@migration('Never reuse admin_event ids')
+def _admin_event_autoincrement(connection):
+    _sqlite_autoincrement(connection, 'admin_event')
+
+
+@migration('Never reuse cache_invalidation ids')
+def _cache_invalidation_autoincrement(connection):
+    _sqlite_autoincrement(connection, 'cache_invalidation')
+
+
+def _rebuild_sqlite_table(connection, name, convert):
+    """SQLite не меняет тип колонки и параметры таблицы: копируем таблицу в новую по текущей модели.
+
+    Индексы пересоздаёт _create_missing_indexes после всех миграций.
+    """
+    table = db.metadata.tables[name]
+    new_table = table.to_metadata(db.metadata, name=f"{name}_new")
+    try:
+        connection.execute(CreateTable(new_table))
+    finally:
+        db.metadata.remove(new_table)
+
+    existing = {column['name'] for column in sa_inspect(connection).get_columns(name)}
+    columns = [column.name for column in table.columns if column.name in existing]
+    values = ', '.join(convert.get(column, f'"{column}"') for column in columns)
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    connection.execute(text(f'INSERT INTO "{name}_new" ({column_list}) SELECT {values} FROM "{name}"'))
+    connection.execute(text(f'DROP TABLE "{name}"'))
+    connection.execute(text(f'ALTER TABLE "{name}_new" RENAME TO "{name}"'))
+
+
+def _create_missing_indexes(connection):
+    """create_all не добавляет индексы в уже существующие таблицы"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def current_version():
+    row = db.session.get(SchemaVersion, 1)
+    return row.version if row else 0
+
+
+def _set_version(version):
+    row = db.session.get(SchemaVersion, 1)
+    if row is None:
+        db.session.add(SchemaVersion(id=1, version=version))
+    else:
+        row.version = version
+
+
+def upgrade():
+    """Создаёт недостающие таблицы и применяет невыполненные миграции.
+
+    Каждая миграция выполняется в своей транзакции вместе с записью номера версии.
+    Возвращает список применённых миграций.
+    """
+    # В новой базе create_all сразу создаёт актуальную схему - миграции не нужны
+    fresh = not sa_inspect(db.session.connection()).get_table_names()
+    db.session.commit()
+    db.create_all()
+    if fresh:
+        _set_version(len(MIGRATIONS))
+        db.session.commit()
+    applied = []
+    version = current_version()
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        apply(db.session.connection())
+        _set_version(number)
+        db.session.commit()
+        applied.append(f"{number}: {description}")
+
+    _create_missing_indexes(db.session.connection())
+    db.session.commit()
+    return applied
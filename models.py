@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from money import Money, MoneyType
 
 db = SQLAlchemy()
 
@@ -14,11 +15,20 @@ class User(db.Model):
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(MoneyType, nullable=False)  # В центах (см. money.py)
     stock_quantity = db.Column(db.Integer, default=0)
     category = db.Column(db.String(50))
     description = db.Column(db.Text)
     image_file = db.Column(db.String(100), nullable=False, default='default_product.png')  # Автоматическое имя
+    reorder_level = db.Column(db.Integer, nullable=False, default=5, server_default='5')  # Порог для дозаказа
+
+    # Частичный индекс содержит только товары на пороге дозаказа или ниже,
+    # поэтому список заканчивающихся товаров не читает весь каталог
+    __table_args__ = (
+        db.Index('ix_product_low_stock', 'stock_quantity', 'id',
+                 sqlite_where=db.text('stock_quantity <= reorder_level'),
+                 postgresql_where=db.text('stock_quantity <= reorder_level')),
+    )
 
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -34,14 +44,14 @@ class ContactMessage(db.Model):
     email = db.Column(db.String(120), nullable=False)
     subject = db.Column(db.String(200))
     message = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(20), unique=True, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
+    total_price = db.Column(MoneyType, nullable=False)
     status = db.Column(db.String(50), default='Processing')
-    order_date = db.Column(db.DateTime, default=datetime.utcnow)
+    order_date = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     # Информация о доставке
     customer_name = db.Column(db.String(100), nullable=False)
@@ -60,6 +70,58 @@ class OrderItem(db.Model):
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    price_per_item = db.Column(db.Float, nullable=False)
+    price_per_item = db.Column(MoneyType, nullable=False)
+
+    product = db.relationship('Product')
+
+
+class DailySales(db.Model):
+    """Дневная сводка продаж: обновляется при оформлении заказа (см. analytics.py)"""
+    day = db.Column(db.Date, primary_key=True)
+    orders_count = db.Column(db.Integer, default=0, nullable=False)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(MoneyType, default=Money(0), nullable=False)
+
+class DailyProductSales(db.Model):
+    """Дневная сводка продаж по товарам. Без внешнего ключа - история переживает удаление товара"""
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(50), index=True)
+    units = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(MoneyType, default=Money(0), nullable=False)
+
+class AdminEvent(db.Model):
+    """Журнал изменений для панели администратора (см. events.py)"""
+    # Воркеры и клиенты читают журнал по id > последнего прочитанного: без AUTOINCREMENT
+    # SQLite после очистки таблицы начал бы id заново и новые события никто бы не увидел
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class StockMovement(db.Model):
+    """Журнал движения склада: строки только добавляются (см. inventory.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    change = db.Column(db.Integer, nullable=False)
+    stock_after = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)  # order, adjustment, import, initial
+    order_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_stock_movement_product', 'product_id', 'id'),)
 
-    product = db.relationship('Product')
\ No newline at end of file
+class SchemaVersion(db.Model):
+    """Номер последней применённой миграции (см. migrations.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+class CacheInvalidation(db.Model):
+    """Журнал сбросов кэша: каждый воркер читает его и удаляет у себя эти ключи (см. cache.py)"""
+    # Читается по id > последнего прочитанного - id не должны повторяться после очистки (см. AdminEvent)
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    namespace = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(100))  # None - сбросить всё пространство имён
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
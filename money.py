@@ -0,0 +1,126 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import total_ordering
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Integer, func, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+# Минимальных единиц (центов) в одной основной единице валюты
+MINOR_UNITS = 100
+
+
+@total_ordering
+class Money:
+    """Денежная сумма в минимальных единицах валюты (центах).
+
+    Магазин работает в одной валюте, поэтому валюта не хранится. Суммы складываются
+    и умножаются на количество без округлений; в шаблонах выводятся как '19.99'.
+    """
+
+    __slots__ = ('minor',)
+
+    def __init__(self, minor=0):
+        # SQLite может вернуть целое значение как float (колонки, созданные до миграции)
+        if isinstance(minor, float) and not minor.is_integer():
+            raise ValueError(f"Minor units must be whole: {minor!r}")
+        self.minor = int(minor)
+
+    @classmethod
+    def parse(cls, value):
+        """Сумма в основных единицах из формы, JSON или файла: '19.99', 19.99, 20"""
+        if isinstance(value, Money):
+            return value
+        try:
+            amount = Decimal(str(value).strip())
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"Invalid amount: {value!r}")
+        if not amount.is_finite():
+            raise ValueError(f"Invalid amount: {value!r}")
+        return cls(int((amount * MINOR_UNITS).to_integral_value(ROUND_HALF_UP)))
+
+    def __add__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.minor + other.minor)
+
+    def __radd__(self, other):
+        # sum() начинает с 0
+        if other == 0:
+            return self
+        return NotImplemented
+
+    def __sub__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.minor - other.minor)
+
+    def __neg__(self):
+        return Money(-self.minor)
+
+    def __mul__(self, quantity):
+        if not isinstance(quantity, int) or isinstance(quantity, bool):
+            return NotImplemented
+        return Money(self.minor * quantity)
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.minor == other.minor
+
+    def __lt__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.minor < other.minor
+
+    def __hash__(self):
+        return hash(self.minor)
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __str__(self):
+        units, cents = divmod(abs(self.minor), MINOR_UNITS)
+        return f"{'-' if self.minor < 0 else ''}{units}.{cents:02d}"
+
+    def __repr__(self):
+        return f"Money('{self}')"
+
+    def to_decimal(self):
+        return Decimal(self.minor) / MINOR_UNITS
+
+
+class MoneyType(TypeDecorator):
+    """Колонка INTEGER с суммой в минимальных единицах, в Python - Money.
+
+    Принимает Money или целое число минимальных единиц. float не принимается,
+    чтобы сумма в основных единицах не записалась как центы.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, Money):
+            return None if value is None else value.minor
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        raise TypeError(f"Expected Money, got {type(value).__name__}")
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else Money(value)
+
+
+def money_sum(expression):
+    """SUM(expression) по колонкам MoneyType в одном запросе; пустая выборка даёт Money(0)"""
+    return type_coerce(func.coalesce(func.sum(expression), 0), MoneyType())
+
+
+class JSONProvider(DefaultJSONProvider):
+    """jsonify отдаёт Money строкой '19.99' - как Decimal, без потери точности"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Money):
+            return str(o)
+        return DefaultJSONProvider.default(o)
@@ -0,0 +1,391 @@
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, insert, update, func
+from werkzeug.utils import secure_filename
+from models import db, Product
+from money import Money
+import cache
+import events
+import inventory
+
+# Сколько строк обрабатывается и коммитится за одну транзакцию
+DEFAULT_BATCH_SIZE = 1000
+
+INTEGER = re.compile(r'-?[0-9]+')
+
+
+def parse_int(value):
+    """Целое из CSV или JSON: int или строка из цифр. bool и дробные числа не приводятся"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    if isinstance(value, str) and not INTEGER.fullmatch(value):
+        raise ValueError(value)
+    return int(value)
+
+
+# Колонки, которые можно импортировать, и их типы
+FIELDS = {
+    'id': parse_int,
+    'name': str,
+    'price': Money.parse,
+    'stock_quantity': parse_int,
+    'category': str,
+    'description': str,
+    'image': str,
+    'reorder_level': parse_int,
+}
+
+# Сигнатуры файлов изображений: расширение -> первые байты
+IMAGE_SIGNATURES = {
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'gif': (b'GIF87a', b'GIF89a'),
+}
+
+
+class ImportReport:
+    """Итог импорта: счётчики и ошибки по номерам строк"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.images = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append({'line': line, 'error': message})
+
+    def to_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'images_attached': self.images,
+            'failed': len(self.errors),
+            'errors': sorted(self.errors, key=lambda e: e['line']),
+        }
+
+
+def detect_format(filename, content_type=None):
+    """Определяет формат по расширению файла или Content-Type"""
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    raise ValueError('Unknown file format, expected CSV or NDJSON')
+
+
+def read_rows(stream, fmt):
+    """Потоково читает текстовый поток и отдаёт (номер строки, dict или ошибка).
+
+    Файл не в UTF-8 или испорченный CSV дальше не читается: отдаётся одна ошибка
+    со следующим номером строки, уже прочитанные строки остаются в силе.
+    """
+    line_no = 0
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                line_no = reader.line_num
+                yield line_no, row
+            return
+
+        for line_no, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, ValueError('Invalid JSON')
+                continue
+            yield line_no, row if isinstance(row, dict) else ValueError('Each line must be a JSON object')
+    except UnicodeDecodeError:
+        yield line_no + 1, ValueError('File is not valid UTF-8, this and the following lines were not imported')
+    except csv.Error as e:
+        yield line_no + 1, ValueError(f'Invalid CSV ({e}), this and the following lines were not imported')
+
+
+def validate_row(raw):
+    """Приводит значения к типам модели. Пустые значения пропускаются (не меняют товар)"""
+    if isinstance(raw, Exception):
+        raise raw
+    values = {}
+    for field, cast in FIELDS.items():
+        value = raw.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        try:
+            values[field] = cast(value.strip() if isinstance(value, str) else value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for '{field}': {value!r}")
+
+    if values.get('price', Money(0)) < Money(0):
+        raise ValueError('Price must not be negative')
+    if values.get('stock_quantity', 0) < 0:
+        raise ValueError('Stock quantity must not be negative')
+    if values.get('reorder_level', 0) < 0:
+        raise ValueError('Reorder level must not be negative')
+    if 'name' in values and len(values['name']) > Product.name.type.length:
+        raise ValueError('Name is too long')
+    if 'category' in values and len(values['category']) > Product.category.type.length:
+        raise ValueError('Category is too long')
+    return values
+
+
+def default_image_name(name):
+    """То же имя изображения, что генерирует create_product"""
+    return f"{name.lower().replace(' ', '_').replace(chr(39), '')}.png"
+
+
+def check_image(source, max_size):
+    """Проверяет расширение, размер и сигнатуру изображения, возвращает расширение"""
+    ext = source.rsplit('.', 1)[-1].lower()
+    if ext not in IMAGE_SIGNATURES:
+        raise ValueError('Invalid image extension')
+    if os.path.getsize(source) > max_size:
+        raise ValueError('Image is too large')
+    with open(source, 'rb') as f:
+        header = f.read(8)
+    if not header.startswith(IMAGE_SIGNATURES[ext]):
+        raise ValueError('File content does not match its extension')
+    return ext
+
+
+def prepare_image(source, upload_folder, product_id, max_size):
+    """Проверяет и копирует изображение в папку загрузок. Выполняется в пуле импорта"""
+    ext = check_image(source, max_size)
+    filename = f"{product_id}_original.{ext}"
+    shutil.copyfile(source, os.path.join(upload_folder, filename))
+    return filename
+
+
+def _match_existing(rows):
+    """Находит id существующих товаров одним запросом на пачку"""
+    names = {values['name'] for _, values in rows if 'id' not in values and 'name' in values}
+    ids = {values['id'] for _, values in rows if 'id' in values}
+
+    by_name = {}
+    if names:
+        query = select(Product.name, func.min(Product.id)).where(Product.name.in_(names)).group_by(Product.name)
+        by_name = dict(db.session.execute(query).all())
+    known_ids = set()
+    if ids:
+        known_ids = set(db.session.execute(select(Product.id).where(Product.id.in_(ids))).scalars())
+    return by_name, known_ids
+
+
+def _apply_batch(rows, report, dry_run):
+    """Разделяет пачку на вставки и обновления и выполняет их через executemany.
+
+    Возвращает список (номер строки, id товара, имя файла изображения) для привязки картинок;
+    при dry_run id новых товаров ещё нет и вместо него None.
+    """
+    by_name, known_ids = _match_existing(rows)
+    inserts, updates, images = {}, {}, []
+
+    for line, values in rows:
+        image = values.pop('image', None)
+        product_id = values.pop('id', None)
+        if product_id is None:
+            product_id = by_name.get(values.get('name'))
+        elif product_id not in known_ids:
+            report.error(line, f'Product {product_id} not found')
+            continue
+
+        if product_id is not None:
+            # Повторы одного товара в пачке сливаются, побеждает последняя строка
+            updates.setdefault(product_id, {'id': product_id, 'line': line}).update(values)
+            if image:
+                images.append((line, product_id, image))
+        elif values.get('name') in inserts or ('name' in values and 'price' in values):
+            # Повторы нового товара сливаются так же: пустые поля не затирают заданные раньше
+            entry = inserts.setdefault(values['name'], {'line': line, 'image': None})
+            entry.update(values)
+            entry['image'] = image or entry['image']
+        else:
+            report.error(line, 'Name and price are required for new products')
+
+    for row in inserts.values():
+        # У всех вставляемых строк одинаковый набор колонок - это один executemany
+        row.setdefault('stock_quantity', 0)
+        row.setdefault('category', None)
+        row.setdefault('description', None)
+        row.setdefault('reorder_level', Product.reorder_level.default.arg)
+        row['image_file'] = default_image_name(row['name'])
+
+    if dry_run:
+        report.created += len(inserts)
+        report.updated += len(updates)
+        return images + [(row['line'], None, row['image']) for row in inserts.values() if row['image']]
+
+    lines = [row.pop('line') for row in updates.values()] + [row.pop('line') for row in inserts.values()]
+    new_images = [row.pop('image') for row in inserts.values()]
+    try:
+        # Массовый UPDATE не видит старых значений - читаем их одним запросом для журнала склада
+        before = inventory.snapshot([product_id for product_id, row in updates.items()
+                                     if 'stock_quantity' in row or 'reorder_level' in row])
+        # Кэш сбрасывается и по старой категории товара, и по новой
+        stale = _cache_keys(list(updates))
+        for params in _group_by_keys(updates.values()):
+            db.session.execute(update(Product), params)
+        if any('category' in row for row in updates.values()):
+            stale.extend(_cache_keys(list(updates)))
+        changes = [(product_id, stock, updates[product_id].get('stock_quantity', stock),
+                    level, updates[product_id].get('reorder_level', level))
+                   for product_id, (stock, level) in before.items()]
+        created = []
+        if inserts:
+            created = db.session.execute(
+                insert(Product).returning(Product.id, sort_by_parameter_order=True), list(inserts.values())
+            ).scalars().all()
+            images.extend((line, product_id, image) for line, product_id, image
+                          in zip(lines[len(updates):], created, new_images) if image)
+            changes.extend((product_id, None, row['stock_quantity'], None, row['reorder_level'])
+                           for product_id, row in zip(created, inserts.values()) if row['stock_quantity'])
+        inventory.record_changes(db.session, changes, 'import')
+        stale.extend((cache.category_products.name, row['category']) for row in inserts.values()
+                     if row['category'] is not None)
+        if inserts or any('category' in row for row in updates.values()):
+            stale.append((cache.categories.name, 'all'))
+        cache.publish(db.session, stale)
+        # Массовые UPDATE/INSERT идут мимо событий сессии - одно событие на всю пачку
+        events.publish_many(db.session, [('products.changed', {'ids': list(updates) + created})])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Product import batch failed: {str(e)}")
+        for line in lines:
+            report.error(line, 'Batch failed to save, no rows of this batch were imported')
+        return []
+
+    report.created += len(inserts)
+    report.updated += len(updates)
+    return images
+
+
+def _cache_keys(product_ids):
+    """Ключи кэша товаров и их страниц категорий по текущим категориям, одним запросом"""
+    if not product_ids:
+        return []
+    rows = db.session.execute(select(Product.id, Product.category).where(Product.id.in_(product_ids))).all()
+    keys = [(cache.products.name, product_id) for product_id, _ in rows]
+    keys.extend((cache.category_products.name, category) for category in {c for _, c in rows} if category is not None)
+    return keys
+
+
+def _group_by_keys(rows):
+    """executemany требует одинаковый набор колонок в каждой пачке параметров"""
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups.values()
+
+
+def import_products(stream, fmt, images_dir=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, workers=None,
+                    executor_class=ThreadPoolExecutor):
+    """Импортирует товары из потока CSV/NDJSON пачками по batch_size строк.
+
+    Строки с ошибками пропускаются и попадают в отчёт, остальные сохраняются.
+    Изображения из images_dir проверяются и копируются в пуле executor_class параллельно
+    с импортом; при dry_run - только проверяются. Пул процессов годится лишь для команды:
+    fork многопоточного воркера gunicorn может зависнуть на чужой блокировке.
+    """
+    if batch_size < 1:
+        raise ValueError('Batch size must be at least 1')
+    report = ImportReport()
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    max_size = current_app.config['MAX_FILE_SIZE']
+    pool = executor_class(max_workers=workers) if images_dir else None
+    pending = []
+
+    rows = read_rows(stream, fmt)
+    try:
+        while True:
+            batch = []
+            for line, raw in islice(rows, batch_size):
+                try:
+                    batch.append((line, validate_row(raw)))
+                except ValueError as e:
+                    report.error(line, str(e))
+            if not batch:
+                break
+
+            for line, product_id, image in _apply_batch(batch, report, dry_run):
+                if pool is None:
+                    continue
+                source = os.path.join(images_dir, secure_filename(image))
+                if not os.path.isfile(source):
+                    report.error(line, f"Image '{image}' not found")
+                    continue
+                if dry_run:
+                    future = pool.submit(check_image, source, max_size)
+                else:
+                    future = pool.submit(prepare_image, source, upload_folder, product_id, max_size)
+                pending.append((line, product_id, future))
+
+        attached = {}
+        for line, product_id, future in pending:
+            try:
+                attached[line] = {'id': product_id, 'image_file': future.result()}
+            except (OSError, ValueError) as e:
+                report.error(line, f'Image: {e}')
+        if attached and not dry_run:
+            try:
+                db.session.execute(update(Product), list(attached.values()))
+                cache.publish(db.session, _cache_keys([row['id'] for row in attached.values()]))
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Product import image update failed: {str(e)}")
+                for line in attached:
+                    report.error(line, 'Image failed to save, the product was imported without it')
+                attached = {}
+        report.images = len(attached)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return report
+
+
+@click.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Default: detected from file extension')
+@click.option('--images-dir', type=click.Path(exists=True, file_okay=False), help='Directory with product images')
+@click.option('--batch-size', type=click.IntRange(min=1), default=DEFAULT_BATCH_SIZE, show_default=True)
+@click.option('--workers', type=click.IntRange(min=1), help='Image worker processes (default: CPU count)')
+@click.option('--dry-run', is_flag=True, help='Only validate the file')
+@with_appcontext
+def import_products_command(path, fmt, images_dir, batch_size, workers, dry_run):
+    """Массовый импорт и обновление товаров из CSV или NDJSON"""
+    try:
+        fmt = fmt or detect_format(path)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--format')
+
+    with open(path, newline='', encoding='utf-8-sig') as stream:
+        report = import_products(stream, fmt, images_dir, batch_size, dry_run, workers,
+                                 executor_class=ProcessPoolExecutor).to_dict()
+
+    for error in report['errors']:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    prefix = 'Dry run: would create' if dry_run else 'Created'
+    print(f"{prefix} {report['created']}, updated {report['updated']}, "
+          f"images {report['images_attached']}, failed {report['failed']}.")
+
+
+def open_text_stream(binary_stream):
+    """Оборачивает бинарный поток запроса в текстовый без чтения его целиком"""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
@@ -0,0 +1,82 @@
+import threading
+import time
+from functools import wraps
+from flask import Blueprint, jsonify, current_app
+from sqlalchemy import text
+from models import db
+
+# Проверки живости и готовности воркера для балансировщика / оркестратора
+health = Blueprint('health', __name__)
+
+_state = {'ready': False, 'draining': False, 'in_flight': 0}
+_condition = threading.Condition()
+
+
+def track_checkout(f):
+    """Учитывает выполняющиеся оформления заказов (видно в /readyz и в логе остановки)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with _condition:
+            _state['in_flight'] += 1
+        try:
+            return f(*args, **kwargs)
+        finally:
+            with _condition:
+                _state['in_flight'] -= 1
+                _condition.notify_all()
+    return decorated_function
+
+
+def compile_templates(app):
+    """Загружает все шаблоны: из байткод-кэша на диске, если он есть, иначе компилирует"""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_up(app):
+    """Готовит воркер до приёма трафика: компилирует шаблоны и открывает соединения пула"""
+    started = time.perf_counter()
+    compile_templates(app)
+    with app.app_context():
+        pool_size = app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_size', 1)
+        connections = [db.engine.connect() for _ in range(pool_size)]
+        for connection in connections:
+            connection.execute(text('SELECT 1'))
+            connection.close()
+
+    _state['ready'] = True
+    app.logger.info(f"Worker warmed up in {time.perf_counter() - started:.2f}s")
+
+
+def begin_shutdown():
+    """Снимает воркер с балансировки: /readyz начинает отвечать 503"""
+    _state['draining'] = True
+
+
+def in_flight():
+    """Число оформлений заказов, которые выполняются прямо сейчас"""
+    with _condition:
+        return _state['in_flight']
+
+
+@health.route('/healthz')
+def healthz():
+    """Процесс жив и обрабатывает запросы"""
+    return jsonify({'status': 'ok'})
+
+
+@health.route('/readyz')
+def readyz():
+    """Воркер прогрет, не останавливается и видит базу данных"""
+    if _state['draining']:
+        return jsonify({'status': 'draining', 'in_flight_checkouts': _state['in_flight']}), 503
+    if not _state['ready']:
+        return jsonify({'status': 'warming up'}), 503
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception as e:
+        current_app.logger.error(f"Readiness check failed: {str(e)}")
+        return jsonify({'status': 'database unavailable'}), 503
+    return jsonify({'status': 'ready', 'in_flight_checkouts': _state['in_flight']})
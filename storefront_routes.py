@@ -0,0 +1,384 @@
+import uuid
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, session, jsonify, flash, current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload
+from sqlalchemy import or_, func, select
+from models import db, User, Product, CartItem, Order, OrderItem
+from decorators import login_required
+from serving import track_checkout
+import cache
+import contact_inbox
+from money import money_sum
+import analytics
+
+# Витрина магазина: каталог, корзина, оформление заказа и личный кабинет
+shop = Blueprint('shop', __name__)
+
+
+def cart_total(user_id):
+    """Сумма корзины одним запросом SUM(quantity * price) в центах"""
+    return db.session.execute(
+        select(money_sum(CartItem.quantity * Product.price))
+        .select_from(CartItem)
+        .join(Product, CartItem.product_id == Product.id)
+        .where(CartItem.user_id == user_id)
+    ).scalar()
+
+
+@shop.route('/')
+def index():
+    FEATURED_PRODUCTS_COUNT = 6
+    products = Product.query.order_by(func.random()).limit(FEATURED_PRODUCTS_COUNT).all()
+    return render_template('index.html', products=products)
+
+@shop.route('/about')
+def about():
+    return render_template('about.html')
+
+@shop.route('/contact', methods=['GET', 'POST'])
+def contact():
+    if request.method == 'POST':
+        first_name = request.form.get('first_name')
+        last_name = request.form.get('last_name')
+        email = request.form.get('email')
+        subject = request.form.get('subject')
+        message = request.form.get('message')
+
+        if not all([first_name, last_name, email, message]):
+            flash('Please fill out all required fields.', 'danger')
+            return redirect(url_for('shop.contact'))
+
+        # Запись в базу - пачкой в фоновом потоке (см. contact_inbox.py)
+        try:
+            contact_inbox.writer.submit(dict(
+                first_name=first_name,
+                last_name=last_name,
+                email=email,
+                subject=subject,
+                message=message
+            ))
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('shop.contact'))
+
+        flash('Thank you for your message!', 'success')
+        return redirect(url_for('shop.contact'))
+
+    return render_template('contact.html')
+
+
+@shop.route('/checkout', methods=['GET', 'POST'])
+@login_required
+@track_checkout
+def checkout():
+    cart_items = CartItem.query.options(joinedload(CartItem.product)).filter_by(user_id=session['user_id']).all()
+    if not cart_items:
+        flash('Your cart is empty.', 'warning')
+        return redirect(url_for('shop.index'))
+
+    # Проверка наличия товаров
+    for item in cart_items:
+        if not item.product or item.product.stock_quantity < item.quantity:
+            flash(f'Product {item.product.name if item.product else "Unknown"} is out of stock or quantity unavailable', 'danger')
+            return redirect(url_for('shop.view_cart'))
+
+    total_price = cart_total(session['user_id'])
+
+    if request.method == 'POST':
+        try:
+            # 1. Получаем данные из формы
+            required_fields = ['first_name', 'last_name', 'address', 'city', 'postal_code', 'country', 'phone', 'email']
+            form_data = {field: request.form.get(field) for field in required_fields}
+
+            # Проверка обязательных полей
+            if not all(form_data.values()):
+                flash('Please fill all required fields.', 'danger')
+                return redirect(url_for('shop.checkout'))
+
+            # 2. Создаем новый заказ
+            new_order = Order(
+                order_number=f"ORD-{uuid.uuid4().hex[:8].upper()}",
+                user_id=session['user_id'],
+                total_price=total_price,
+                status='Processing',
+                payment_method=request.form.get('payment_method', 'Credit Card'),
+                customer_name=f"{form_data['first_name']} {form_data['last_name']}",
+                customer_email=form_data['email'],
+                customer_phone=form_data['phone'],
+                shipping_address=f"{form_data['address']}, {form_data['city']}, {form_data['postal_code']}, {form_data['country']}",
+                order_date=datetime.utcnow()
+            )
+
+            db.session.add(new_order)
+            db.session.flush()  # Получаем ID заказа
+
+            # 3. Переносим товары из корзины в заказ
+            order_items = []
+            for item in cart_items:
+                if item.product.stock_quantity < item.quantity:
+                    raise ValueError(f'Not enough stock for {item.product.name}')
+
+                order_item = OrderItem(
+                    order_id=new_order.id,
+                    product_id=item.product_id,
+                    quantity=item.quantity,
+                    price_per_item=item.product.price,
+                    product_name=item.product.name,
+                    product_image=item.product.image_file
+                )
+
+                # 4. Уменьшаем количество товара на складе
+                item.product.stock_quantity -= item.quantity
+
+                db.session.add(order_item)
+                order_items.append(order_item)
+
+            # 5. Обновляем дневные сводки продаж
+            analytics.record_order(new_order, order_items)
+
+            # 6. Очищаем корзину
+            CartItem.query.filter_by(user_id=session['user_id']).delete()
+            cache.publish(db.session, [(cache.cart_counts.name, session['user_id'])])
+
+            db.session.commit()
+
+            # Отправка email (заглушка для реализации)
+            # send_order_confirmation_email(new_order)
+
+            flash('Your order has been placed successfully!', 'success')
+            return redirect(url_for('shop.order_details', order_id=new_order.id))
+
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('shop.view_cart'))
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred while processing your order.', 'danger')
+            current_app.logger.error(f"Order processing error: {str(e)}")
+            return redirect(url_for('shop.checkout'))
+
+    return render_template('checkout.html',
+                         cart_items=cart_items,
+                         total_price=total_price,
+                         user=User.query.get(session['user_id']))
+
+@shop.route('/orders')
+@login_required
+def order_history():
+    orders = Order.query.filter_by(user_id=session['user_id'])\
+                       .order_by(Order.order_date.desc())\
+                       .all()
+    return render_template('order_history.html', orders=orders)
+
+@shop.route('/orders/<int:order_id>')
+@login_required
+def order_details(order_id):
+    order = Order.query.filter_by(id=order_id, user_id=session['user_id']).first_or_404()
+    return render_template('order_details.html', order=order)
+
+
+
+@shop.route('/catalog')
+def catalog_index():
+
+    def load():
+        categories = db.session.query(Product.category).distinct().all()
+        return [category[0] for category in categories]
+
+    return render_template('catalog.html', categories=cache.categories.get_or_load('all', load))
+
+@shop.route('/catalog/<string:category_name>')
+def category_view(category_name):
+
+    def load():
+        return [cache.snapshot(p) for p in Product.query.filter_by(category=category_name).all()]
+
+    products_in_category = cache.category_products.get_or_load(category_name, load)
+    return render_template('category_products.html', products=products_in_category, category_name=category_name)
+
+@shop.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        user = User.query.filter_by(username=request.form.get('username')).first()
+        if user and check_password_hash(user.password_hash, request.form.get('password')):
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['role'] = user.role
+            return redirect(url_for('shop.index'))
+        else:
+            flash('Invalid username or password.', 'danger')
+    return render_template('login.html')
+
+@shop.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        username = request.form.get('username')
+        email = request.form.get('email')
+        password = request.form.get('password')
+        if not all([username, email, password]):
+            flash('All fields are required.', 'danger')
+            return redirect(url_for('shop.register'))
+        if User.query.filter((User.username == username) | (User.email == email)).first():
+            flash('Username or email already exists.', 'danger')
+            return redirect(url_for('shop.register'))
+
+        new_user = User(username=username, email=email, password_hash=generate_password_hash(password))
+        db.session.add(new_user)
+        db.session.commit()
+        flash('Registration successful! Please log in.', 'success')
+        return redirect(url_for('shop.login'))
+    return render_template('register.html')
+
+@shop.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('shop.index'))
+
+@shop.route('/cart')
+@login_required
+def view_cart():
+    cart_items = CartItem.query.options(joinedload(CartItem.product)).filter_by(user_id=session['user_id']).all()
+    return render_template('cart.html', cart_items=cart_items, total_price=cart_total(session['user_id']))
+
+
+@shop.route('/add_to_cart/<int:product_id>', methods=['POST'])
+@login_required
+def add_to_cart(product_id):
+    product = Product.query.get_or_404(product_id)
+    cart_item = CartItem.query.filter_by(user_id=session['user_id'], product_id=product.id).first()
+    if cart_item:
+        cart_item.quantity += 1
+    else:
+        cart_item = CartItem(user_id=session['user_id'], product_id=product.id, quantity=1)
+        db.session.add(cart_item)
+    db.session.commit()
+    new_count = db.session.query(func.sum(CartItem.quantity)).filter_by(user_id=session['user_id']).scalar() or 0
+    return jsonify({'success': True, 'message': f'Added {product.name} to cart!', 'cart_items_count': int(new_count)})
+
+@shop.route('/product/<int:product_id>')
+def product(product_id):
+    def load():
+        return cache.snapshot(Product.query.get_or_404(product_id))
+
+    # 404 не кэшируется: get_or_404 прерывает загрузку исключением
+    return render_template('product_page.html', product=cache.products.get_or_load(product_id, load))
+
+@shop.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    products = []
+    if query:
+        search_term = f"%{query}%"
+        products = Product.query.filter(or_(Product.name.ilike(search_term))).all()
+    return render_template('search_results.html', products=products, query=query)
+
+@shop.route('/profile')
+@login_required
+def user_profile():
+    user = User.query.get_or_404(session['user_id'])
+    return render_template('profile.html', user=user)
+
+
+@shop.route('/process_payment', methods=['POST'])
+@login_required
+@track_checkout
+def process_payment():
+    try:
+        # Получаем данные из формы
+        first_name = request.form.get('first_name')
+        last_name = request.form.get('last_name')
+        address = request.form.get('address')
+        city = request.form.get('city')
+        country = request.form.get('country')
+        postal_code = request.form.get('postal_code')
+        phone_number = request.form.get('phone_number')
+
+        # Проверяем обязательные поля
+        if not all([first_name, last_name, address, city, country, postal_code, phone_number]):
+            flash('Please fill all required fields', 'danger')
+            return redirect(url_for('shop.checkout'))
+
+        # Получаем товары из корзины
+        cart_items = CartItem.query.filter_by(user_id=session['user_id']).all()
+        if not cart_items:
+            flash('Your cart is empty', 'warning')
+            return redirect(url_for('shop.checkout'))
+
+        # Создаем заказ (убедитесь, что все поля модели Order заполнены)
+        order = Order(
+            order_number=f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            user_id=session['user_id'],
+            total_price=cart_total(session['user_id']),
+            status='Paid',
+            customer_name=first_name,
+            customer_lastname=last_name,  # Это обязательное поле
+            shipping_address=address,
+            postal_code=postal_code,
+            city=city,
+            country=country,
+            phone_number=phone_number
+        )
+
+        db.session.add(order)
+        db.session.flush()  # Получаем ID заказа
+
+        # Добавляем товары в заказ
+        order_items = []
+        for item in cart_items:
+            order_item = OrderItem(
+                order_id=order.id,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                price_per_item=item.product.price
+            )
+            db.session.add(order_item)
+            order_items.append(order_item)
+            # Уменьшаем количество на складе
+            item.product.stock_quantity -= item.quantity
+
+        # Обновляем дневные сводки продаж
+        analytics.record_order(order, order_items)
+
+        # Очищаем корзину
+        CartItem.query.filter_by(user_id=session['user_id']).delete()
+        cache.publish(db.session, [(cache.cart_counts.name, session['user_id'])])
+
+        db.session.commit()
+
+        return redirect(url_for('shop.order_details', order_id=order.id))
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Order processing error: {str(e)}")
+        flash('Error processing your order. Please try again.', 'danger')
+        return redirect(url_for('shop.checkout'))
+
+# === API для Корзины (Cart) ===
+
+@shop.route('/api/cart/item/<int:item_id>', methods=['PUT'])
+@login_required
+def update_cart_item(item_id):
+    """Обновляет количество товара в корзине."""
+    item = CartItem.query.filter_by(id=item_id, user_id=session['user_id']).first_or_404()
+    data = request.get_json()
+
+    if 'quantity' in data:
+        new_quantity = int(data['quantity'])
+        if new_quantity > 0:
+            item.quantity = new_quantity
+        else:
+            db.session.delete(item)
+
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Cart updated.'})
+
+@shop.route('/api/cart/item/<int:item_id>', methods=['DELETE'])
+@login_required
+def delete_cart_item(item_id):
+    """Удаляет товар из корзины."""
+    item = CartItem.query.filter_by(id=item_id, user_id=session['user_id']).first_or_404()
+    db.session.delete(item)
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Item removed from cart.'})
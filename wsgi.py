@@ -0,0 +1,19 @@
+"""Точка входа WSGI для продакшена.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+SHOP_PARTS=storefront или SHOP_PARTS=admin запускает только одну половину приложения.
+"""
+import os
+
+if not os.environ.get('SECRET_KEY'):
+    raise RuntimeError('SECRET_KEY environment variable must be set in production')
+
+from app import create_app
+from serving import warm_up
+
+application = create_app()
+
+# Модуль импортируется в каждом воркере (preload_app выключен), поэтому
+# шаблоны и пул соединений прогреваются до того, как воркер начнёт принимать запросы
+warm_up(application)